@@ -0,0 +1,137 @@
+"""Admission control for the Dash callback endpoint.
+
+Every POST to /_dash-update-component passes through an AdmissionController
+before Dash runs the callback. At most max_in_flight callbacks run at once
+per app process; the rest wait for a slot. Cheap outputs (KPI cards, salary
+text and other small text outputs) always wait and go first when a slot
+frees up. Expensive outputs (the figures) only wait while fewer than
+queue_limit requests are waiting, and for at most max_wait seconds.
+Otherwise they are degraded. If the same callback was answered for the same
+inputs recently, the last-known response is served again. Failing that, the
+request is shed with 204 No Content, which Dash treats as "no update", so the
+browser keeps showing the previous figure.
+
+Degraded responses carry an X-Admission header ('cached' or 'shed'), and
+GET /_admission returns this process's counters as JSON.
+"""
+import functools
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, jsonify, request
+
+CALLBACK_ENDPOINT = '/_dash-update-component'
+DEFAULT_MAX_WAIT = 2.0
+DEFAULT_CACHE_SIZE = 256
+
+
+class AdmissionController:
+    """Bounds in-flight callbacks and degrades expensive ones under overload"""
+
+    def __init__(self, max_in_flight, expensive, queue_limit=None, max_wait=DEFAULT_MAX_WAIT,
+                 cache_size=DEFAULT_CACHE_SIZE):
+        self.max_in_flight = max_in_flight
+        self.expensive = set(expensive)
+        self.queue_limit = max_in_flight if queue_limit is None else queue_limit
+        self.max_wait = max_wait
+        self.cache_size = cache_size
+        self.in_flight = 0
+        self.waiting = {'cheap': 0, 'expensive': 0}
+        self.counters = {'cheap_admitted': 0, 'cheap_queued': 0, 'expensive_admitted': 0,
+                         'expensive_queued': 0, 'expensive_cached': 0, 'expensive_shed': 0,
+                         'peak_waiting': 0}
+        self._cache = OrderedDict()
+        self._cond = threading.Condition()
+
+    def is_expensive(self, body):
+        """Whether a callback request targets one of the expensive outputs"""
+        output = body.get('output', '').strip('.').split('...')[0]
+        return output.rsplit('.', 1)[0] in self.expensive
+
+    @staticmethod
+    def cache_key(body):
+        inputs = [(i.get('id'), i.get('property'), i.get('value')) for i in body.get('inputs', [])]
+        state = [(s.get('id'), s.get('property'), s.get('value')) for s in body.get('state', [])]
+        return json.dumps([body.get('output'), inputs, state], sort_keys=True, default=str)
+
+    def _can_start(self, kind):
+        # Expensive callbacks give way to any cheap one that is waiting
+        return self.in_flight < self.max_in_flight and (kind == 'cheap' or self.waiting['cheap'] == 0)
+
+    def acquire(self, kind):
+        """Take a slot; expensive callbacks give up (False) when the queue is long or slow"""
+        with self._cond:
+            if kind == 'expensive' and not self._can_start(kind) and \
+                    sum(self.waiting.values()) >= self.queue_limit:
+                return False
+            if self._can_start(kind):
+                self.in_flight += 1
+                self.counters[kind + '_admitted'] += 1
+                return True
+
+            self.waiting[kind] += 1
+            self.counters[kind + '_queued'] += 1
+            self.counters['peak_waiting'] = max(self.counters['peak_waiting'], sum(self.waiting.values()))
+            deadline = time.monotonic() + self.max_wait
+            try:
+                while not self._can_start(kind):
+                    remaining = deadline - time.monotonic()
+                    if kind == 'expensive' and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining if kind == 'expensive' else None)
+                self.in_flight += 1
+                self.counters[kind + '_admitted'] += 1
+                return True
+            finally:
+                self.waiting[kind] -= 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def remember(self, key, data):
+        with self._cond:
+            self._cache[key] = data
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def degrade(self, key):
+        """Last-known response for the same request, or 204 No Content"""
+        with self._cond:
+            data = self._cache.get(key)
+            self.counters['expensive_cached' if data is not None else 'expensive_shed'] += 1
+        if data is not None:
+            return Response(data, mimetype='application/json', headers={'X-Admission': 'cached'})
+        return Response(status=204, headers={'X-Admission': 'shed'})
+
+    def stats(self):
+        with self._cond:
+            return dict(self.counters, in_flight=self.in_flight, waiting=sum(self.waiting.values()),
+                        max_in_flight=self.max_in_flight, queue_limit=self.queue_limit)
+
+
+def register_admission_control(server, controller):
+    """Put the controller in front of Dash's callback endpoint and add GET /_admission"""
+    view = server.view_functions[CALLBACK_ENDPOINT]
+
+    @functools.wraps(view)
+    def admitted(*args, **kwargs):
+        body = request.get_json(silent=True) or {}
+        kind = 'expensive' if controller.is_expensive(body) else 'cheap'
+        key = controller.cache_key(body) if kind == 'expensive' else None
+        if not controller.acquire(kind):
+            return controller.degrade(key)
+        try:
+            response = server.make_response(view(*args, **kwargs))
+        finally:
+            controller.release()
+        if key is not None and response.status_code == 200:
+            controller.remember(key, response.get_data())
+        return response
+
+    server.view_functions[CALLBACK_ENDPOINT] = admitted
+    server.add_url_rule('/_admission', 'admission_stats', lambda: jsonify(controller.stats()))
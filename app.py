@@ -1,14 +1,52 @@
-from dash import Dash, html, dcc, Input, Output
+import os
+
+from dash import Dash, html, dcc, dash_table, ctx, Input, Output, State
+from flask import g, has_request_context
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
-# Initialize app with Bootstrap theme
-app = Dash(__name__, external_stylesheets=['https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css'])
+from admission import DEFAULT_MAX_WAIT, AdmissionController, register_admission_control
+from backends import DataFrameBackend, make_selection
+from datasets import DEFAULT_DATASET, Dataset, DatasetCache, dataset_name, dataset_paths, query_value
+from ingest import DEFAULT_CHUNKSIZE, build_cube
+from parallel import ParallelBackend
+from routing import ResponseCache, register_selection_routing
+from row_export import export_url, register_row_export
+from sampling import SampleBackend
+from sqlite_backend import SQLiteBackend, build_database
+from static_assets import (GEOJSON_SOURCE, asset_url, build_assets, register_static_assets, script_urls,
+                           stylesheet_urls)
+
+# 'bubbles' draws the map on the server; 'choropleth' draws state outlines in the
+# browser from a cached GeoJSON and only receives the per-state totals
+MAP_MODE = os.environ.get('DASHBOARD_MAP', 'bubbles')
+
+# Initialize app with the self-hosted Bootstrap theme and dashboard styles
+ASSETS = build_assets()
+app = Dash(__name__, external_stylesheets=stylesheet_urls(ASSETS), external_scripts=script_urls(ASSETS))
 
 server = app.server
+register_static_assets(server)
 
-# Add custom CSS for checkbox styling
+# Under load, run at most DASHBOARD_MAX_IN_FLIGHT callbacks at once per process,
+# KPI and salary text first; figures past the queue limit are served from cache or shed
+EXPENSIVE_OUTPUTS = ['australia-map', 'state-counts', 'nationality-chart', 'employment-rate',
+                     'gender-ratio', 'migration-reasons', 'trend-chart', 'compare-nationality']
+if os.environ.get('DASHBOARD_MAX_IN_FLIGHT'):
+    admission = AdmissionController(
+        int(os.environ['DASHBOARD_MAX_IN_FLIGHT']), EXPENSIVE_OUTPUTS,
+        queue_limit=int(os.environ['DASHBOARD_QUEUE_LIMIT']) if os.environ.get('DASHBOARD_QUEUE_LIMIT') else None,
+        max_wait=float(os.environ.get('DASHBOARD_MAX_WAIT', DEFAULT_MAX_WAIT)))
+    register_admission_control(server, admission)
+
+# Callback responses carry the X-Selection-Key a front proxy can route on; with
+# DASHBOARD_RESPONSE_CACHE set, repeats of a selection are answered from memory
+# ahead of admission control
+RESPONSE_CACHE_SIZE = int(os.environ.get('DASHBOARD_RESPONSE_CACHE', 0))
+register_selection_routing(server, ResponseCache(RESPONSE_CACHE_SIZE) if RESPONSE_CACHE_SIZE else None)
+
+# Page template; the dashboard styles are served from static/dashboard.css
 app.index_string = '''
 <!DOCTYPE html>
 <html>
@@ -17,102 +55,6 @@ app.index_string = '''
         <title>{%title%}</title>
         {%favicon%}
         {%css%}
-        <style>
-            body {
-                margin: 0;
-                padding: 0;
-                overflow: hidden;
-            }
-            
-            /* Custom checkbox styling */
-            .custom-checkbox input[type="checkbox"] {
-                width: 14px;
-                height: 14px;
-                margin-right: 4px;
-                accent-color: #002E79;
-                cursor: pointer;
-            }
-            
-            .custom-checkbox label {
-                cursor: pointer;
-                transition: color 0.2s ease;
-                font-weight: 500;
-                color: #495057;
-            }
-            
-            .custom-checkbox label:hover {
-                color: #002E79;
-            }
-            
-            /* Checked state styling */
-            .custom-checkbox input[type="checkbox"]:checked + label {
-                color: #002E79;
-                font-weight: 600;
-            }
-            
-            /* Filter section headers */
-            .filter-header {
-                border-bottom: 2px solid #dee2e6;
-                padding-bottom: 3px;
-                font-size: 11px;
-                margin: 0 0 5px 0;
-                font-weight: 600;
-                color: #495057;
-                letter-spacing: 0.5px;
-            }
-            
-            /* Sidebar styling */
-            .sidebar-filters {
-                background-color: #f5f5f5;
-                border-right: 2px solid #000;
-            }
-            
-            /* Checkbox container styling */
-            .filter-group {
-                background-color: white;
-                padding: 8px;
-                border-radius: 0px;
-                margin-bottom: 0px;
-                border-top: 2px solid #000;
-                border-bottom: 2px solid #000;
-                border-left: 1px solid #ccc;
-                border-right: 1px solid #ccc;
-            }
-            
-            /* Box styling */
-            .chart-box {
-                background-color: white;
-                border: 2px solid #000;
-                padding: 0;
-                height: 100%;
-            }
-            
-            .box-header {
-                text-align: center !important;
-                padding: 8px !important;
-                margin: 0 !important;
-            }
-            
-            /* Source box styling */
-            .source-box {
-                background-color: white;
-                border: 2px solid #000;
-                padding: 0px;
-                text-align: center;
-                font-size: 9px;
-                line-height: 1.4;
-            }
-            
-            .source-box a {
-                color: #002E79;
-                text-decoration: none;
-                font-weight: 600;
-            }
-            
-            .source-box a:hover {
-                text-decoration: underline;
-            }
-        </style>
     </head>
     <body>
         {%app_entry%}
@@ -125,16 +67,122 @@ app.index_string = '''
 </html>
 '''
 
-# Load data from CSV
-df = pd.read_csv('international students data.csv')
+# Load data from CSV, either whole, streamed in chunks into an aggregate cube,
+# shared with a pool of worker processes, or loaded into an indexed SQLite file
+DATA_PATH = 'international students data.csv'
+
+
+# Approximate mode: selections of at least DASHBOARD_EXACT_BELOW rows are answered
+# from a stratified sample, with 95% confidence intervals; ?exact=1 turns it off
+SAMPLE_FRACTION = float(os.environ['DASHBOARD_SAMPLE_FRACTION']) if os.environ.get('DASHBOARD_SAMPLE_FRACTION') else None
+EXACT_BELOW = int(os.environ.get('DASHBOARD_EXACT_BELOW', 100_000))
+
+
+# Helper function to load one dataset with the configured backend
+def load_dataset(name, path):
+    if os.environ.get('DASHBOARD_BACKEND') == 'sqlite':
+        sqlite_path = os.path.splitext(path)[0] + '.sqlite'
+        if name == DEFAULT_DATASET:
+            sqlite_path = os.environ.get('DASHBOARD_SQLITE_PATH', sqlite_path)
+        if not os.path.exists(sqlite_path):
+            build_database(path, sqlite_path)
+        backend = SQLiteBackend(sqlite_path)
+    elif os.environ.get('DASHBOARD_INGEST') == 'chunked':
+        backend = build_cube(path, int(os.environ.get('DASHBOARD_CHUNKSIZE', DEFAULT_CHUNKSIZE)))
+    elif os.environ.get('DASHBOARD_WORKERS'):
+        backend = ParallelBackend(pd.read_csv(path), int(os.environ['DASHBOARD_WORKERS']),
+                                  os.environ.get('DASHBOARD_PARTITION', 'rows'))
+    else:
+        backend = DataFrameBackend(pd.read_csv(path))
+    return Dataset(name, backend, SAMPLE_FRACTION)
+
+
+# Datasets are picked with ?dataset=<name>, loaded on first use and evicted least
+# recently used first when they go over the per-process memory budget
+MEMORY_BUDGET_MB = os.environ.get('DASHBOARD_MEMORY_BUDGET_MB')
+datasets = DatasetCache(dataset_paths(DATA_PATH, os.environ.get('DASHBOARD_DATA_DIR')), load_dataset,
+                        int(float(MEMORY_BUDGET_MB) * 2 ** 20) if MEMORY_BUDGET_MB else None)
+
+
+# Helper function to find the dataset named in the page URL; during a request it
+# stays open until the request ends, even if another request evicts it meanwhile
+def current_dataset(search=None):
+    if not has_request_context():
+        return datasets.get(dataset_name(search))
+    dataset = datasets.acquire(dataset_name(search))
+    g.setdefault('datasets', []).append(dataset)
+    return dataset
+
+
+@server.teardown_request
+def release_datasets(error=None):
+    for dataset in g.pop('datasets', []):
+        datasets.release(dataset)
+
+
+# Helper function choosing the sample or the exact backend for a selection
+def query_backend(selection, search=None):
+    dataset = current_dataset(search)
+    if dataset.sample is None or query_value(search, 'exact') == '1' or dataset.sample.count(selection) < EXACT_BELOW:
+        return dataset.backend
+    return dataset.sample
+
+
+# Helper function formatting a 95% confidence interval as a share of the value
+def format_margin(value, margin):
+    if margin is None or not value:
+        return ''
+    return f" ±{100 * margin / abs(value):.1f}%"
+
 
-# Extract unique values for filters
-states = df['State'].unique() if 'State' in df.columns else ['NSW', 'VIC', 'QLD', 'WA', 'SA', 'TAS', 'ACT', 'NT']
-industries = df['Industry'].unique() if 'Industry' in df.columns else ['Health', 'STEM', 'Social Sc.', 'Design', 'Business', 'Education', 'Prof. Serv', 'Services']
-years = sorted(df['Year'].unique()) if 'Year' in df.columns else [2022, 2023, 2024]
+# Streamed CSV/Parquet downloads of the rows behind the current filters
+register_row_export(server, current_dataset)
+
+
+# Extract unique values for filters; the year options follow the dataset in the URL
+states = current_dataset().states
+industries = current_dataset().industries
+years = current_dataset().years
+
+ROW_PAGE_SIZE = 15
+
+# Dropdowns of the comparison's second selection: dimension, component id, placeholder
+COMPARE_FILTERS = [('State', 'compare-state', 'All states'),
+                   ('Industry', 'compare-industry', 'All industries'),
+                   ('Study_Level', 'compare-study', 'All study levels'),
+                   ('Employment_Type', 'compare-employment', 'All employment types'),
+                   ('Year', 'compare-year', 'All years')]
+COMPARE_COLORS = ['#002E79', '#9BC1FF']
+
+
+# Helper function listing a dataset's values for one comparison dropdown
+def compare_options(dataset, dimension):
+    return dataset.backend.values(dimension) if dimension in dataset.backend.columns else []
+
+
+# Helper function to describe the row table columns, numeric ones filtered as numbers
+def row_table_columns(dataset):
+    frame = dataset.explorer.frame if dataset.explorer is not None else None
+    return [{'name': column.replace('_', ' '), 'id': column,
+             'type': 'numeric' if frame is not None and pd.api.types.is_numeric_dtype(frame[column]) else 'text'}
+            for column in (frame.columns if frame is not None else dataset.backend.columns)]
+
+
+TREND_LABELS = {
+    'Visa_Applications': 'Student visa applications',
+    'Post_Study_Work': 'Post-study work',
+    'Job_Placement': 'Job placement',
+    'Skilled_Visa': 'Skilled visa applications',
+    'PR_Grant': 'PR grant',
+    'Employment_Rate': 'Employment rate',
+    'Salary': 'Mean salary',
+}
 
 # Dashboard layout
 app.layout = html.Div([
+    # Page URL, which names the dataset
+    dcc.Location(id='url', refresh=False),
+    
     # Header
     html.Div([
         html.H1('INTERNATIONAL STUDENT EMPLOYABILITY DASHBOARD - AUSTRALIA',
@@ -182,6 +230,9 @@ app.layout = html.Div([
                   'padding': '8px', 'margin': '2px', 'backgroundColor': 'white', 'border': '2px solid #000'}),
     ], style={'textAlign': 'center', 'marginBottom': '5px', 'marginTop': '3px'}),
     
+    # Shown when the values come from the sample
+    html.Div(id='approx-note', style={'textAlign': 'center', 'fontSize': '10px', 'color': '#666'}),
+    
     # Main Content Row
     html.Div([
         # Left Sidebar - Filters
@@ -325,6 +376,13 @@ app.layout = html.Div([
                 ),
             ], className='filter-group'),
             
+            # Download the filtered rows
+            html.Div([
+                html.H4('DOWNLOAD ROWS', className='filter-header'),
+                html.A('CSV', id='export-csv', href='', style={'fontSize': '10px', 'marginRight': '8px'}),
+                html.A('PARQUET', id='export-parquet', href='', style={'fontSize': '10px'}),
+            ], className='filter-group'),
+            
         ], className='sidebar-filters', style={'width': '13%', 'display': 'inline-block', 'verticalAlign': 'top',
                   'padding': '3px', 'height': '590px', 'overflowY': 'auto'}),
         
@@ -337,7 +395,8 @@ app.layout = html.Div([
                        style={'backgroundColor': '#5288E0', 'color': 'white', 
                               'fontSize': '11px', 'fontWeight': '600'}),
                 html.Div([
-                    dcc.Graph(id='australia-map', style={'height': '530px'}, config={'displayModeBar': False})
+                    dcc.Graph(id='australia-map', style={'height': '530px'}, config={'displayModeBar': False}),
+                    dcc.Store(id='state-counts')
                 ], style={'padding': '0px', 'height': '530px'})
             ], className='chart-box', style={'height': '570px', 'marginBottom': '0px'}),
             
@@ -422,7 +481,104 @@ app.layout = html.Div([
                                           'padding': '2px', 'textAlign': 'center'})
     ]),
     
-], style={'fontFamily': 'Arial, sans-serif', 'backgroundColor': '#ffffff', 'margin': '0', 'padding': '0', 'height': '100vh', 'overflow': 'hidden'})
+    # Year-over-year Trends Section, below the fold
+    html.Div([
+        html.H2('YEAR-OVER-YEAR TRENDS',
+                style={'textAlign': 'center', 'backgroundColor': '#5288E0', 'color': 'white',
+                       'margin': '0', 'padding': '8px', 'fontSize': '15px', 'fontWeight': '600'}),
+        html.Div([
+            # Range and measure selectors
+            html.Div([
+                html.H4('YEAR RANGE', className='filter-header'),
+                dcc.RangeSlider(
+                    id='year-range',
+                    min=years[0],
+                    max=years[-1],
+                    step=1,
+                    value=[years[0], years[-1]],
+                    marks={year: str(year) for year in years}
+                ),
+                html.H4('MEASURE', className='filter-header', style={'marginTop': '10px'}),
+                dcc.Dropdown(
+                    id='trend-measure',
+                    options=[{'label': label, 'value': column} for column, label in TREND_LABELS.items()],
+                    value='Visa_Applications',
+                    clearable=False,
+                    style={'fontSize': '11px'}
+                ),
+                html.Div(id='trend-summary', style={'fontSize': '13px', 'fontWeight': '600', 'color': '#002E79',
+                                                    'marginTop': '12px'}),
+            ], className='filter-group', style={'width': '22%', 'display': 'inline-block', 'verticalAlign': 'top',
+                                                'padding': '8px'}),
+            
+            html.Div([
+                dcc.Graph(id='trend-chart', style={'height': '300px'}, config={'displayModeBar': False})
+            ], className='chart-box', style={'width': '75%', 'display': 'inline-block', 'verticalAlign': 'top',
+                                             'marginLeft': '5px'}),
+        ], style={'marginTop': '5px'}),
+    ], style={'marginTop': '20px'}),
+    
+    # Comparison Section: the sidebar filters (A) against a second selection (B)
+    html.Div([
+        html.H2('COMPARE SELECTIONS',
+                style={'textAlign': 'center', 'backgroundColor': '#5288E0', 'color': 'white',
+                       'margin': '0', 'padding': '8px', 'fontSize': '15px', 'fontWeight': '600'}),
+        html.Div([
+            # Second selection; A always follows the sidebar filters
+            html.Div([
+                html.H4('SELECTION B', className='filter-header'),
+                html.Div([
+                    dcc.Dropdown(
+                        id=component_id,
+                        options=compare_options(current_dataset(), dimension),
+                        value=[],
+                        multi=True,
+                        placeholder=placeholder,
+                        style={'fontSize': '11px', 'marginBottom': '6px'}
+                    ) for dimension, component_id, placeholder in COMPARE_FILTERS
+                ]),
+                html.Div(id='compare-kpis', style={'marginTop': '10px'}),
+            ], className='filter-group', style={'width': '30%', 'display': 'inline-block', 'verticalAlign': 'top',
+                                                'padding': '8px'}),
+            
+            html.Div([
+                dcc.Graph(id='compare-nationality', style={'height': '420px'}, config={'displayModeBar': False})
+            ], className='chart-box', style={'width': '33%', 'display': 'inline-block', 'verticalAlign': 'top',
+                                             'marginLeft': '5px'}),
+            
+            html.Div([
+                dcc.Graph(id='compare-gender', style={'height': '170px'}, config={'displayModeBar': False}),
+                dcc.Graph(id='compare-migration', style={'height': '250px'}, config={'displayModeBar': False})
+            ], className='chart-box', style={'width': '33%', 'display': 'inline-block', 'verticalAlign': 'top',
+                                             'marginLeft': '5px'}),
+        ], style={'marginTop': '5px'}),
+    ], style={'marginTop': '20px'}),
+    
+    # Row Explorer Section; pages, sorting and column filters are resolved on the server
+    html.Div([
+        html.H2('ROW EXPLORER',
+                style={'textAlign': 'center', 'backgroundColor': '#5288E0', 'color': 'white',
+                       'margin': '0', 'padding': '8px', 'fontSize': '15px', 'fontWeight': '600'}),
+        html.Div(id='row-summary', style={'fontSize': '12px', 'fontWeight': '600', 'color': '#002E79',
+                                          'padding': '6px 8px'}),
+        dash_table.DataTable(
+            id='row-table',
+            columns=row_table_columns(current_dataset()),
+            page_action='custom',
+            page_current=0,
+            page_size=ROW_PAGE_SIZE,
+            sort_action='custom',
+            sort_mode='single',
+            sort_by=[],
+            filter_action='custom',
+            filter_query='',
+            style_table={'overflowX': 'auto'},
+            style_header={'backgroundColor': '#002E79', 'color': 'white', 'fontWeight': '600', 'fontSize': '11px'},
+            style_cell={'fontFamily': 'Arial, sans-serif', 'fontSize': '11px', 'padding': '4px'}
+        ),
+    ], style={'marginTop': '20px', 'marginBottom': '20px'}),
+    
+], style={'fontFamily': 'Arial, sans-serif', 'backgroundColor': '#ffffff', 'margin': '0', 'padding': '0', 'height': '100vh', 'overflowY': 'auto'})
 
 
 # Helper function to combine filter values
@@ -435,27 +591,104 @@ def combine_filters(filter_values_list):
     return combined if combined else []
 
 
-# Helper function to filter data
-def filter_data(locations, industries_filter, study_levels, employment_types, years_filter):
-    filtered_df = df.copy()
-    
-    if 'ALL' not in locations and 'State' in df.columns:
-        filtered_df = filtered_df[filtered_df['State'].isin(locations)]
-    
-    if 'ALL' not in industries_filter and 'Industry' in df.columns:
-        filtered_df = filtered_df[filtered_df['Industry'].isin(industries_filter)]
+# Helper function to turn the checklist values into a backend selection
+def read_selection(loc_all, ind_all, ind1, ind2, ind3, ind4,
+                   study1, study2, study3, emp1, emp2, years_filter):
+    locations = loc_all if loc_all else ['ALL']
+    if not locations or 'ALL' in locations:
+        locations = ['ALL']
     
-    if 'ALL' not in study_levels and 'Study_Level' in df.columns:
-        filtered_df = filtered_df[filtered_df['Study_Level'].isin(study_levels)]
+    industries_filter = combine_filters([ind_all, ind1, ind2, ind3, ind4])
+    if not industries_filter or 'ALL' in ind_all:
+        industries_filter = ['ALL']
     
-    if 'ALL' not in employment_types and 'Employment_Type' in df.columns:
-        filtered_df = filtered_df[filtered_df['Employment_Type'].isin(employment_types)]
+    study_levels = combine_filters([study1, study2, study3])
+    if not study_levels or 'ALL' in study1:
+        study_levels = ['ALL']
     
-    if 'ALL' not in years_filter and 'Year' in df.columns:
-        years_int = [int(y) for y in years_filter if y != 'ALL']
-        filtered_df = filtered_df[filtered_df['Year'].isin(years_int)]
+    employment_types = combine_filters([emp1, emp2])
+    if not employment_types or 'ALL' in emp1:
+        employment_types = ['ALL']
     
-    return filtered_df
+    return make_selection(locations, industries_filter, study_levels, employment_types, years_filter)
+
+
+# Helper function to filter data
+def filter_data(locations, industries_filter, study_levels, employment_types, years_filter, search=None):
+    return current_dataset(search).backend.filter(make_selection(locations, industries_filter, study_levels, employment_types, years_filter))
+
+
+# Callback pointing the download links at the current selection
+@app.callback(
+    [Output('export-csv', 'href'),
+     Output('export-parquet', 'href')],
+    [Input('location-filter', 'value'),
+     Input('industry-filter-all', 'value'),
+     Input('industry-filter1', 'value'),
+     Input('industry-filter2', 'value'),
+     Input('industry-filter3', 'value'),
+     Input('industry-filter4', 'value'),
+     Input('study-filter', 'value'),
+     Input('study-filter2', 'value'),
+     Input('study-filter3', 'value'),
+     Input('employment-filter', 'value'),
+     Input('employment-filter2', 'value'),
+     Input('year-filter', 'value')],
+    [State('url', 'search')])
+def update_export_links(loc_all, ind_all, ind1, ind2, ind3, ind4,
+                        study1, study2, study3, emp1, emp2, years_filter, search=None):
+    
+    selection = read_selection(loc_all, ind_all, ind1, ind2, ind3, ind4,
+                               study1, study2, study3, emp1, emp2, years_filter)
+    return export_url(selection, 'csv', search), export_url(selection, 'parquet', search)
+
+
+# Callback flagging approximate values, with a link to the exact ones
+@app.callback(
+    Output('approx-note', 'children'),
+    [Input('location-filter', 'value'),
+     Input('industry-filter-all', 'value'),
+     Input('industry-filter1', 'value'),
+     Input('industry-filter2', 'value'),
+     Input('industry-filter3', 'value'),
+     Input('industry-filter4', 'value'),
+     Input('study-filter', 'value'),
+     Input('study-filter2', 'value'),
+     Input('study-filter3', 'value'),
+     Input('employment-filter', 'value'),
+     Input('employment-filter2', 'value'),
+     Input('year-filter', 'value')],
+    [State('url', 'search')])
+def update_approx_note(loc_all, ind_all, ind1, ind2, ind3, ind4,
+                       study1, study2, study3, emp1, emp2, years_filter, search=None):
+    
+    selection = read_selection(loc_all, ind_all, ind1, ind2, ind3, ind4,
+                               study1, study2, study3, emp1, emp2, years_filter)
+    backend = query_backend(selection, search)
+    
+    if not isinstance(backend, SampleBackend):
+        return ''
+    exact_search = (search + '&' if search else '?') + 'exact=1'
+    return [f'Approximate values from a {backend.fraction:.0%} stratified sample, with 95% confidence intervals. ',
+            html.A('Show exact values', href=exact_search)]
+
+
+# Callback matching the year and comparison options to the dataset in the URL
+@app.callback(
+    [Output('year-filter', 'options'),
+     Output('year-range', 'min'),
+     Output('year-range', 'max'),
+     Output('year-range', 'value'),
+     Output('year-range', 'marks')] +
+    [Output(component_id, 'options') for _, component_id, _ in COMPARE_FILTERS],
+    [Input('url', 'search')])
+def update_year_options(search):
+    dataset = current_dataset(search)
+    dataset_years = dataset.years
+    options = [{'label': 'ALL', 'value': 'ALL'}] + [{'label': str(year), 'value': str(year)} for year in dataset_years]
+    return (options, dataset_years[0], dataset_years[-1], [dataset_years[0], dataset_years[-1]],
+            {year: str(year) for year in dataset_years},
+            *(compare_options(dataset, dimension) for dimension, _, _ in COMPARE_FILTERS))
 
 
 # Callbacks for KPIs
@@ -476,30 +709,21 @@ def filter_data(locations, industries_filter, study_levels, employment_types, ye
      Input('study-filter3', 'value'),
      Input('employment-filter', 'value'),
      Input('employment-filter2', 'value'),
-     Input('year-filter', 'value')])
+     Input('year-filter', 'value')],
+    [State('url', 'search')])
 def update_kpis(loc_all, ind_all, ind1, ind2, ind3, ind4, 
-                study1, study2, study3, emp1, emp2, years_filter):
+                study1, study2, study3, emp1, emp2, years_filter, search=None):
     
-    locations = loc_all if loc_all else ['ALL']
-    if not locations or 'ALL' in locations:
-        locations = ['ALL']
+    selection = read_selection(loc_all, ind_all, ind1, ind2, ind3, ind4,
+                               study1, study2, study3, emp1, emp2, years_filter)
+    backend = query_backend(selection, search)
     
-    industries_filter = combine_filters([ind_all, ind1, ind2, ind3, ind4])
-    if not industries_filter or 'ALL' in ind_all:
-        industries_filter = ['ALL']
-    
-    study_levels = combine_filters([study1, study2, study3])
-    if not study_levels or 'ALL' in study1:
-        study_levels = ['ALL']
-    
-    employment_types = combine_filters([emp1, emp2])
-    if not employment_types or 'ALL' in emp1:
-        employment_types = ['ALL']
-    
-    filtered_df = filter_data(locations, industries_filter, study_levels, employment_types, years_filter)
+    kpi_columns = [c for c in ['Visa_Applications', 'Post_Study_Work', 'Job_Placement', 'Skilled_Visa', 'PR_Grant']
+                   if c in backend.columns]
+    totals = backend.total(selection, kpi_columns)
     
-    if 'Visa_Applications' in filtered_df.columns:
-        visa_apps_sum = filtered_df['Visa_Applications'].sum()
+    if 'Visa_Applications' in backend.columns:
+        visa_apps_sum = totals['Visa_Applications']
         if visa_apps_sum >= 1000:
             visa_apps = f"{visa_apps_sum/1000:.0f}K"
         else:
@@ -507,8 +731,8 @@ def update_kpis(loc_all, ind_all, ind1, ind2, ind3, ind4,
     else:
         visa_apps = "100K"
     
-    if 'Post_Study_Work' in filtered_df.columns:
-        post_study_sum = filtered_df['Post_Study_Work'].sum()
+    if 'Post_Study_Work' in backend.columns:
+        post_study_sum = totals['Post_Study_Work']
         if post_study_sum >= 1000:
             post_study = f"{post_study_sum/1000:.0f}K"
         else:
@@ -516,8 +740,8 @@ def update_kpis(loc_all, ind_all, ind1, ind2, ind3, ind4,
     else:
         post_study = "30K"
     
-    if 'Job_Placement' in filtered_df.columns:
-        job_placement_sum = filtered_df['Job_Placement'].sum()
+    if 'Job_Placement' in backend.columns:
+        job_placement_sum = totals['Job_Placement']
         if job_placement_sum >= 1000:
             job_placement = f"{job_placement_sum/1000:.0f}K"
         else:
@@ -525,8 +749,8 @@ def update_kpis(loc_all, ind_all, ind1, ind2, ind3, ind4,
     else:
         job_placement = "21K"
     
-    if 'Skilled_Visa' in filtered_df.columns:
-        skilled_visa_sum = filtered_df['Skilled_Visa'].sum()
+    if 'Skilled_Visa' in backend.columns:
+        skilled_visa_sum = totals['Skilled_Visa']
         if skilled_visa_sum >= 1000:
             if skilled_visa_sum/1000 < 10 and (skilled_visa_sum/1000) % 1 != 0:
                 skilled_visa = f"{skilled_visa_sum/1000:.1f}K"
@@ -537,8 +761,8 @@ def update_kpis(loc_all, ind_all, ind1, ind2, ind3, ind4,
     else:
         skilled_visa = "7.5K"
     
-    if 'PR_Grant' in filtered_df.columns:
-        pr_grant_sum = filtered_df['PR_Grant'].sum()
+    if 'PR_Grant' in backend.columns:
+        pr_grant_sum = totals['PR_Grant']
         if pr_grant_sum >= 1000:
             pr_grant = f"{pr_grant_sum/1000:.0f}K"
         else:
@@ -546,53 +770,31 @@ def update_kpis(loc_all, ind_all, ind1, ind2, ind3, ind4,
     else:
         pr_grant = "7K"
     
+    # Approximate totals carry their 95% confidence interval
+    if isinstance(backend, SampleBackend) and backend.count(selection) > 0:
+        margins = backend.total_margin(selection, kpi_columns)
+        visa_apps += format_margin(totals.get('Visa_Applications'), margins.get('Visa_Applications'))
+        post_study += format_margin(totals.get('Post_Study_Work'), margins.get('Post_Study_Work'))
+        job_placement += format_margin(totals.get('Job_Placement'), margins.get('Job_Placement'))
+        skilled_visa += format_margin(totals.get('Skilled_Visa'), margins.get('Skilled_Visa'))
+        pr_grant += format_margin(totals.get('PR_Grant'), margins.get('PR_Grant'))
+    
     return visa_apps, post_study, job_placement, skilled_visa, pr_grant
 
 
-# Callback for Australia map
-@app.callback(
-    Output('australia-map', 'figure'),
-    [Input('location-filter', 'value'),
-     Input('industry-filter-all', 'value'),
-     Input('industry-filter1', 'value'),
-     Input('industry-filter2', 'value'),
-     Input('industry-filter3', 'value'),
-     Input('industry-filter4', 'value'),
-     Input('study-filter', 'value'),
-     Input('study-filter2', 'value'),
-     Input('study-filter3', 'value'),
-     Input('employment-filter', 'value'),
-     Input('employment-filter2', 'value'),
-     Input('year-filter', 'value')])
-def update_map(loc_all, ind_all, ind1, ind2, ind3, ind4, 
-               study1, study2, study3, emp1, emp2, years_filter):
-    
-    locations = loc_all if loc_all else ['ALL']
-    if not locations or 'ALL' in locations:
-        locations = ['ALL']
-    
-    industries_filter = combine_filters([ind_all, ind1, ind2, ind3, ind4])
-    if not industries_filter or 'ALL' in ind_all:
-        industries_filter = ['ALL']
-    
-    study_levels = combine_filters([study1, study2, study3])
-    if not study_levels or 'ALL' in study1:
-        study_levels = ['ALL']
-    
-    employment_types = combine_filters([emp1, emp2])
-    if not employment_types or 'ALL' in emp1:
-        employment_types = ['ALL']
-    
-    filtered_df = filter_data(locations, industries_filter, study_levels, employment_types, years_filter)
-    
-    if 'State' in filtered_df.columns and 'Student_Count' in filtered_df.columns:
-        state_data = filtered_df.groupby('State')['Student_Count'].sum().reset_index()
-    else:
-        state_data = pd.DataFrame({
-            'State': ['NSW', 'VIC', 'QLD', 'WA', 'SA', 'TAS', 'NT', 'ACT'],
-            'Student_Count': [15000, 12000, 8000, 6000, 3000, 1500, 1000, 2000]
-        })
-    
+# Helper function for the per-state student totals shown on the map
+def state_counts(selection, search=None):
+    backend = query_backend(selection, search)
+    if 'State' in backend.columns and 'Student_Count' in backend.columns:
+        return backend.sum_by(selection, ['State'], 'Student_Count')
+    return pd.DataFrame({
+        'State': ['NSW', 'VIC', 'QLD', 'WA', 'SA', 'TAS', 'NT', 'ACT'],
+        'Student_Count': [15000, 12000, 8000, 6000, 3000, 1500, 1000, 2000]
+    })
+
+
+# Helper function drawing the bubble map on the server
+def map_figure(state_data):
     state_coords = {
         'NSW': (-33.8688, 151.2093), 'VIC': (-37.8136, 144.9631),
         'QLD': (-27.4698, 153.0251), 'WA': (-31.9505, 115.8605),
@@ -634,9 +836,9 @@ def update_map(loc_all, ind_all, ind1, ind2, ind3, ind4,
     return fig
 
 
-# Callback for nationality chart
+# Callback for Australia map
 @app.callback(
-    Output('nationality-chart', 'figure'),
+    Output('state-counts', 'data') if MAP_MODE == 'choropleth' else Output('australia-map', 'figure'),
     [Input('location-filter', 'value'),
      Input('industry-filter-all', 'value'),
      Input('industry-filter1', 'value'),
@@ -648,30 +850,94 @@ def update_map(loc_all, ind_all, ind1, ind2, ind3, ind4,
      Input('study-filter3', 'value'),
      Input('employment-filter', 'value'),
      Input('employment-filter2', 'value'),
-     Input('year-filter', 'value')])
-def update_nationality(loc_all, ind_all, ind1, ind2, ind3, ind4, 
-                       study1, study2, study3, emp1, emp2, years_filter):
-    
-    locations = loc_all if loc_all else ['ALL']
-    if not locations or 'ALL' in locations:
-        locations = ['ALL']
+     Input('year-filter', 'value')],
+    [State('url', 'search')])
+def update_map(loc_all, ind_all, ind1, ind2, ind3, ind4, 
+               study1, study2, study3, emp1, emp2, years_filter, search=None):
     
-    industries_filter = combine_filters([ind_all, ind1, ind2, ind3, ind4])
-    if not industries_filter or 'ALL' in ind_all:
-        industries_filter = ['ALL']
+    selection = read_selection(loc_all, ind_all, ind1, ind2, ind3, ind4,
+                               study1, study2, study3, emp1, emp2, years_filter)
+    state_data = state_counts(selection, search)
     
-    study_levels = combine_filters([study1, study2, study3])
-    if not study_levels or 'ALL' in study1:
-        study_levels = ['ALL']
+    if MAP_MODE == 'choropleth':
+        return {
+            'geojson': asset_url(ASSETS, GEOJSON_SOURCE),
+            'states': state_data['State'].tolist(),
+            'counts': state_data['Student_Count'].tolist()
+        }
     
-    employment_types = combine_filters([emp1, emp2])
-    if not employment_types or 'ALL' in emp1:
-        employment_types = ['ALL']
+    return map_figure(state_data)
+
+
+# Draw the choropleth in the browser; the GeoJSON is fetched once per page and
+# then served from the browser cache, as its fingerprinted URL never changes
+if MAP_MODE == 'choropleth':
+    app.clientside_callback(
+        """
+        function(counts) {
+            if (!counts) {
+                return window.dash_clientside.no_update;
+            }
+            var cache = window.stateGeojson = window.stateGeojson || {};
+            if (!cache[counts.geojson]) {
+                cache[counts.geojson] = fetch(counts.geojson).then(function(r) { return r.json(); });
+            }
+            return cache[counts.geojson].then(function(geojson) {
+                return {
+                    data: [{
+                        type: 'choropleth',
+                        geojson: geojson,
+                        featureidkey: 'properties.code',
+                        locations: counts.states,
+                        z: counts.counts,
+                        colorscale: [[0, '#FFC977'], [0.33, '#F8BD3C'], [0.67, '#E9631D'], [1, '#D53223']],
+                        showscale: false,
+                        marker: {line: {color: '#666', width: 0.5}},
+                        hovertemplate: '<b>%{location}</b><br>Student_Count=%{z}<extra></extra>'
+                    }],
+                    layout: {
+                        geo: {fitbounds: 'locations', visible: false, projection: {type: 'mercator'}, bgcolor: 'white'},
+                        margin: {l: 0, r: 0, t: 0, b: 0},
+                        paper_bgcolor: 'white',
+                        height: 530
+                    }
+                };
+            });
+        }
+        """,
+        Output('australia-map', 'figure'),
+        Input('state-counts', 'data')
+    )
+
+
+# Callback for nationality chart
+@app.callback(
+    Output('nationality-chart', 'figure'),
+    [Input('location-filter', 'value'),
+     Input('industry-filter-all', 'value'),
+     Input('industry-filter1', 'value'),
+     Input('industry-filter2', 'value'),
+     Input('industry-filter3', 'value'),
+     Input('industry-filter4', 'value'),
+     Input('study-filter', 'value'),
+     Input('study-filter2', 'value'),
+     Input('study-filter3', 'value'),
+     Input('employment-filter', 'value'),
+     Input('employment-filter2', 'value'),
+     Input('year-filter', 'value')],
+    [State('url', 'search')])
+def update_nationality(loc_all, ind_all, ind1, ind2, ind3, ind4, 
+                       study1, study2, study3, emp1, emp2, years_filter, search=None):
     
-    filtered_df = filter_data(locations, industries_filter, study_levels, employment_types, years_filter)
+    selection = read_selection(loc_all, ind_all, ind1, ind2, ind3, ind4,
+                               study1, study2, study3, emp1, emp2, years_filter)
+    backend = query_backend(selection, search)
     
-    if 'Nationality' in filtered_df.columns and 'Job_Achieved_Pct' in filtered_df.columns:
-        nationality_data = filtered_df.groupby('Nationality')['Job_Achieved_Pct'].mean().reset_index()
+    if 'Nationality' in backend.columns and 'Job_Achieved_Pct' in backend.columns:
+        nationality_data = backend.mean_by(selection, ['Nationality'], 'Job_Achieved_Pct')
+        if isinstance(backend, SampleBackend):
+            margins = backend.mean_by_margin(selection, ['Nationality'], 'Job_Achieved_Pct')
+            nationality_data['Margin'] = margins['Job_Achieved_Pct'].to_numpy()
         nationality_data = nationality_data.sort_values('Job_Achieved_Pct', ascending=False).head(10)
         nationality_data = nationality_data.sort_values('Job_Achieved_Pct', ascending=True)
     else:
@@ -687,7 +953,8 @@ def update_nationality(loc_all, ind_all, ind1, ind2, ind3, ind4,
                  orientation='h',
                  color='Job_Achieved_Pct',
                  color_continuous_scale=['#9BC1FF', '#5288E0', '#002E79'],
-                 text='Job_Achieved_Pct')
+                 text='Job_Achieved_Pct',
+                 error_x='Margin' if 'Margin' in nationality_data.columns else None)
     
     fig.update_traces(texttemplate='%{text:.0f}', textposition='inside', 
                      textfont=dict(size=11, color='white', weight='bold'))
@@ -722,33 +989,23 @@ def update_nationality(loc_all, ind_all, ind1, ind2, ind3, ind4,
      Input('study-filter3', 'value'),
      Input('employment-filter', 'value'),
      Input('employment-filter2', 'value'),
-     Input('year-filter', 'value')])
+     Input('year-filter', 'value')],
+    [State('url', 'search')])
 def update_salary(loc_all, ind_all, ind1, ind2, ind3, ind4, 
-                  study1, study2, study3, emp1, emp2, years_filter):
+                  study1, study2, study3, emp1, emp2, years_filter, search=None):
     
-    locations = loc_all if loc_all else ['ALL']
-    if not locations or 'ALL' in locations:
-        locations = ['ALL']
-    
-    industries_filter = combine_filters([ind_all, ind1, ind2, ind3, ind4])
-    if not industries_filter or 'ALL' in ind_all:
-        industries_filter = ['ALL']
-    
-    study_levels = combine_filters([study1, study2, study3])
-    if not study_levels or 'ALL' in study1:
-        study_levels = ['ALL']
+    selection = read_selection(loc_all, ind_all, ind1, ind2, ind3, ind4,
+                               study1, study2, study3, emp1, emp2, years_filter)
+    backend = query_backend(selection, search)
     
-    employment_types = combine_filters([emp1, emp2])
-    if not employment_types or 'ALL' in emp1:
-        employment_types = ['ALL']
-    
-    filtered_df = filter_data(locations, industries_filter, study_levels, employment_types, years_filter)
-    
-    if 'Salary' in filtered_df.columns and len(filtered_df) > 0:
-        median_sal = filtered_df['Salary'].median()
-        mean_sal = filtered_df['Salary'].mean()
+    if 'Salary' in backend.columns and backend.count(selection) > 0:
+        median_sal = backend.median(selection, 'Salary')
+        mean_sal = backend.mean(selection, 'Salary')
         median_sal_str = f"${median_sal:,.0f}"
         mean_sal_str = f"${mean_sal:,.0f}"
+        if isinstance(backend, SampleBackend):
+            median_sal_str += format_margin(median_sal, backend.median_margin(selection, 'Salary'))
+            mean_sal_str += format_margin(mean_sal, backend.mean_margin(selection, 'Salary'))
     else:
         median_sal_str = "$98,000"
         mean_sal_str = "$75,000"
@@ -770,33 +1027,25 @@ def update_salary(loc_all, ind_all, ind1, ind2, ind3, ind4,
      Input('study-filter3', 'value'),
      Input('employment-filter', 'value'),
      Input('employment-filter2', 'value'),
-     Input('year-filter', 'value')])
+     Input('year-filter', 'value')],
+    [State('url', 'search')])
 def update_employment_rate(loc_all, ind_all, ind1, ind2, ind3, ind4, 
-                           study1, study2, study3, emp1, emp2, years_filter):
+                           study1, study2, study3, emp1, emp2, years_filter, search=None):
     
-    locations = loc_all if loc_all else ['ALL']
-    if not locations or 'ALL' in locations:
-        locations = ['ALL']
-    
-    industries_filter = combine_filters([ind_all, ind1, ind2, ind3, ind4])
-    if not industries_filter or 'ALL' in ind_all:
-        industries_filter = ['ALL']
+    selection = read_selection(loc_all, ind_all, ind1, ind2, ind3, ind4,
+                               study1, study2, study3, emp1, emp2, years_filter)
+    backend = query_backend(selection, search)
     
-    study_levels = combine_filters([study1, study2, study3])
-    if not study_levels or 'ALL' in study1:
-        study_levels = ['ALL']
-    
-    employment_types = combine_filters([emp1, emp2])
-    if not employment_types or 'ALL' in emp1:
-        employment_types = ['ALL']
-    
-    filtered_df = filter_data(locations, industries_filter, study_levels, employment_types, years_filter)
-    
-    if 'Employment_Rate' in filtered_df.columns and len(filtered_df) > 0:
-        emp_rate = filtered_df['Employment_Rate'].mean()
+    measured = 'Employment_Rate' in backend.columns and backend.count(selection) > 0
+    if measured:
+        emp_rate = backend.mean(selection, 'Employment_Rate')
     else:
         emp_rate = 85
     
+    emp_text = f'{emp_rate:.0f}%'
+    if measured and isinstance(backend, SampleBackend):
+        emp_text += f"<br><span style='font-size:11px'>±{backend.mean_margin(selection, 'Employment_Rate'):.1f} pts</span>"
+    
     donut_data = pd.DataFrame({
         'Category': ['Employed', 'Unemployed'],
         'Value': [emp_rate, 100 - emp_rate]
@@ -812,7 +1061,7 @@ def update_employment_rate(loc_all, ind_all, ind1, ind2, ind3, ind4,
     fig.update_traces(textinfo='none', showlegend=False)
     
     fig.add_annotation(
-        text=f'{emp_rate:.0f}%',
+        text=emp_text,
         x=0.5, y=0.5,
         font=dict(size=32, color='#002E79', weight='bold'),
         showarrow=False,
@@ -843,30 +1092,17 @@ def update_employment_rate(loc_all, ind_all, ind1, ind2, ind3, ind4,
      Input('study-filter3', 'value'),
      Input('employment-filter', 'value'),
      Input('employment-filter2', 'value'),
-     Input('year-filter', 'value')])
+     Input('year-filter', 'value')],
+    [State('url', 'search')])
 def update_gender_ratio(loc_all, ind_all, ind1, ind2, ind3, ind4, 
-                        study1, study2, study3, emp1, emp2, years_filter):
-    
-    locations = loc_all if loc_all else ['ALL']
-    if not locations or 'ALL' in locations:
-        locations = ['ALL']
-    
-    industries_filter = combine_filters([ind_all, ind1, ind2, ind3, ind4])
-    if not industries_filter or 'ALL' in ind_all:
-        industries_filter = ['ALL']
-    
-    study_levels = combine_filters([study1, study2, study3])
-    if not study_levels or 'ALL' in study1:
-        study_levels = ['ALL']
+                        study1, study2, study3, emp1, emp2, years_filter, search=None):
     
-    employment_types = combine_filters([emp1, emp2])
-    if not employment_types or 'ALL' in emp1:
-        employment_types = ['ALL']
+    selection = read_selection(loc_all, ind_all, ind1, ind2, ind3, ind4,
+                               study1, study2, study3, emp1, emp2, years_filter)
+    backend = query_backend(selection, search)
     
-    filtered_df = filter_data(locations, industries_filter, study_levels, employment_types, years_filter)
-    
-    if 'Gender' in filtered_df.columns and 'Student_Count' in filtered_df.columns and len(filtered_df) > 0:
-        gender_data = filtered_df.groupby('Gender')['Student_Count'].sum().reset_index()
+    if 'Gender' in backend.columns and 'Student_Count' in backend.columns and backend.count(selection) > 0:
+        gender_data = backend.sum_by(selection, ['Gender'], 'Student_Count')
         gender_data.columns = ['Gender', 'Count']
         all_genders = pd.DataFrame({'Gender': ['Male', 'Female', 'Others']})
         gender_data = all_genders.merge(gender_data, on='Gender', how='left').fillna(0)
@@ -909,30 +1145,17 @@ def update_gender_ratio(loc_all, ind_all, ind1, ind2, ind3, ind4,
      Input('study-filter3', 'value'),
      Input('employment-filter', 'value'),
      Input('employment-filter2', 'value'),
-     Input('year-filter', 'value')])
+     Input('year-filter', 'value')],
+    [State('url', 'search')])
 def update_migration_reasons(loc_all, ind_all, ind1, ind2, ind3, ind4, 
-                             study1, study2, study3, emp1, emp2, years_filter):
-    
-    locations = loc_all if loc_all else ['ALL']
-    if not locations or 'ALL' in locations:
-        locations = ['ALL']
+                             study1, study2, study3, emp1, emp2, years_filter, search=None):
     
-    industries_filter = combine_filters([ind_all, ind1, ind2, ind3, ind4])
-    if not industries_filter or 'ALL' in ind_all:
-        industries_filter = ['ALL']
+    selection = read_selection(loc_all, ind_all, ind1, ind2, ind3, ind4,
+                               study1, study2, study3, emp1, emp2, years_filter)
+    backend = query_backend(selection, search)
     
-    study_levels = combine_filters([study1, study2, study3])
-    if not study_levels or 'ALL' in study1:
-        study_levels = ['ALL']
-    
-    employment_types = combine_filters([emp1, emp2])
-    if not employment_types or 'ALL' in emp1:
-        employment_types = ['ALL']
-    
-    filtered_df = filter_data(locations, industries_filter, study_levels, employment_types, years_filter)
-    
-    if 'Migration_Reason' in filtered_df.columns and 'Gender' in filtered_df.columns and 'Student_Count' in filtered_df.columns:
-        migration_data = filtered_df.groupby(['Migration_Reason', 'Gender'])['Student_Count'].sum().reset_index()
+    if 'Migration_Reason' in backend.columns and 'Gender' in backend.columns and 'Student_Count' in backend.columns:
+        migration_data = backend.sum_by(selection, ['Migration_Reason', 'Gender'], 'Student_Count')
         migration_data.columns = ['Migration_Reason', 'Gender', 'Count']
         migration_pivot = migration_data.pivot(index='Migration_Reason', columns='Gender', values='Count').fillna(0)
     else:
@@ -998,6 +1221,293 @@ def update_migration_reasons(loc_all, ind_all, ind1, ind2, ind3, ind4,
     return fig
 
 
+# Callback for the year-over-year trend view; the year range replaces the year checklist
+@app.callback(
+    [Output('trend-chart', 'figure'),
+     Output('trend-summary', 'children')],
+    [Input('location-filter', 'value'),
+     Input('industry-filter-all', 'value'),
+     Input('industry-filter1', 'value'),
+     Input('industry-filter2', 'value'),
+     Input('industry-filter3', 'value'),
+     Input('industry-filter4', 'value'),
+     Input('study-filter', 'value'),
+     Input('study-filter2', 'value'),
+     Input('study-filter3', 'value'),
+     Input('employment-filter', 'value'),
+     Input('employment-filter2', 'value'),
+     Input('year-range', 'value'),
+     Input('trend-measure', 'value')],
+    [State('url', 'search')])
+def update_trends(loc_all, ind_all, ind1, ind2, ind3, ind4,
+                  study1, study2, study3, emp1, emp2, year_range, measure, search=None):
+    
+    dataset = current_dataset(search)
+    selection = read_selection(loc_all, ind_all, ind1, ind2, ind3, ind4,
+                               study1, study2, study3, emp1, emp2, ['ALL'])
+    first_year, last_year = year_range if year_range else (dataset.years[0], dataset.years[-1])
+    if measure not in TREND_LABELS:
+        measure = 'Visa_Applications'
+    
+    if dataset.year_sums is not None and measure in dataset.year_sums.measures:
+        trend_data = dataset.year_sums.yearly(selection, first_year, last_year)
+        range_value = dataset.year_sums.range_totals(selection, first_year, last_year)[measure]
+    else:
+        trend_data = pd.DataFrame({
+            'Year': [2022, 2023, 2024],
+            measure: [95000, 100000, 105000],
+            measure + '_Change': [float('nan'), 5.3, 5.0]
+        })
+        range_value = trend_data[measure].sum()
+    
+    if measure == 'Salary':
+        value_format, summary = '$%{y:,.0f}', f"Mean over the range: ${range_value:,.0f}"
+    elif measure == 'Employment_Rate':
+        value_format, summary = '%{y:.1f}%', f"Mean over the range: {range_value:.1f}%"
+    else:
+        value_format, summary = '%{y:,.0f}', f"Total over the range: {range_value:,.0f}"
+    
+    changes = trend_data[measure + '_Change']
+    fig = go.Figure()
+    
+    fig.add_trace(go.Bar(
+        x=trend_data['Year'].astype(str),
+        y=trend_data[measure],
+        marker=dict(color='#002E79'),
+        text=['' if pd.isna(change) else f'{change:+.1f}%' for change in changes],
+        textposition='outside',
+        textfont=dict(size=11, color='#002E79', weight='bold'),
+        hovertemplate='%{x}<br>' + value_format + '<br>%{text} vs previous year<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        xaxis_title='',
+        yaxis_title=TREND_LABELS[measure],
+        margin=dict(l=5, r=5, t=20, b=20),
+        height=300,
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        xaxis=dict(type='category', tickfont=dict(size=10)),
+        yaxis=dict(gridcolor='lightgray', tickfont=dict(size=9), title_font=dict(size=10))
+    )
+    
+    return fig, summary
+
+
+# Helper function to label a selection in the comparison
+def describe_selection(selection):
+    parts = [', '.join(str(value) for value in selection[dimension])
+             for dimension, _, _ in COMPARE_FILTERS if selection.get(dimension) is not None]
+    return ' / '.join(parts) if parts else 'All students'
+
+
+# Helper function to format a comparison value and the change from A to B
+def compare_cells(label, a, b, kind):
+    def fmt(value):
+        if value is None or pd.isna(value):
+            return '-'
+        if kind == 'salary':
+            return f"${value:,.0f}"
+        if kind == 'rate':
+            return f"{value:.1f}%"
+        return f"{value/1000:.1f}K" if value >= 1000 else f"{value:.0f}"
+    
+    if a is None or b is None or pd.isna(a) or pd.isna(b) or (kind != 'rate' and not a):
+        change = '-'
+    elif kind == 'rate':
+        change = f"{b - a:+.1f} pts"
+    else:
+        change = f"{(b - a) / a * 100:+.1f}%"
+    return html.Tr([html.Td(label, style={'fontWeight': '600'}), html.Td(fmt(a)), html.Td(fmt(b)), html.Td(change)])
+
+
+# Callback for the comparison; both selections are answered by one backend.compare() call
+@app.callback(
+    [Output('compare-nationality', 'figure'),
+     Output('compare-kpis', 'children'),
+     Output('compare-gender', 'figure'),
+     Output('compare-migration', 'figure')],
+    [Input('location-filter', 'value'),
+     Input('industry-filter-all', 'value'),
+     Input('industry-filter1', 'value'),
+     Input('industry-filter2', 'value'),
+     Input('industry-filter3', 'value'),
+     Input('industry-filter4', 'value'),
+     Input('study-filter', 'value'),
+     Input('study-filter2', 'value'),
+     Input('study-filter3', 'value'),
+     Input('employment-filter', 'value'),
+     Input('employment-filter2', 'value'),
+     Input('year-filter', 'value'),
+     Input('compare-state', 'value'),
+     Input('compare-industry', 'value'),
+     Input('compare-study', 'value'),
+     Input('compare-employment', 'value'),
+     Input('compare-year', 'value')],
+    [State('url', 'search')])
+def update_comparison(loc_all, ind_all, ind1, ind2, ind3, ind4,
+                      study1, study2, study3, emp1, emp2, years_filter,
+                      compare_states, compare_industries, compare_study, compare_employment, compare_years,
+                      search=None):
+    
+    selections = [read_selection(loc_all, ind_all, ind1, ind2, ind3, ind4,
+                                 study1, study2, study3, emp1, emp2, years_filter),
+                  make_selection(compare_states, compare_industries, compare_study, compare_employment,
+                                 compare_years or None)]
+    names = [f"A: {describe_selection(selections[0])}", f"B: {describe_selection(selections[1])}"]
+    backend = current_dataset(search).backend
+    columns = backend.columns
+    
+    # Every panel's queries, asked for both selections together
+    kpi_columns = [c for c in ['Visa_Applications', 'Post_Study_Work', 'Job_Placement', 'Skilled_Visa', 'PR_Grant']
+                   if c in columns]
+    queries = {'count': ('count', ()), 'kpis': ('total', (kpi_columns,))}
+    if 'Nationality' in columns and 'Job_Achieved_Pct' in columns:
+        queries['nationality'] = ('mean_by', (['Nationality'], 'Job_Achieved_Pct'))
+    if 'Salary' in columns:
+        queries['median_salary'] = ('median', ('Salary',))
+        queries['mean_salary'] = ('mean', ('Salary',))
+    if 'Employment_Rate' in columns:
+        queries['employment'] = ('mean', ('Employment_Rate',))
+    if 'Gender' in columns and 'Student_Count' in columns:
+        queries['gender'] = ('sum_by', (['Gender'], 'Student_Count'))
+        if 'Migration_Reason' in columns:
+            queries['migration'] = ('sum_by', (['Migration_Reason'], 'Student_Count'))
+    results = backend.compare(selections, queries)
+    
+    def side(name, position):
+        return results[name][position] if name in results and results['count'][position] > 0 else None
+    
+    # Nationality: the top 10 of A (or of B when A is empty), both sides on the same bars
+    nationality_fig = go.Figure()
+    if 'nationality' in results:
+        ranked = side('nationality', 0) if side('nationality', 0) is not None else side('nationality', 1)
+        top = ranked.sort_values('Job_Achieved_Pct', ascending=False).head(10)['Nationality'].tolist()[::-1] \
+            if ranked is not None else []
+        for position in (0, 1):
+            data = side('nationality', position)
+            values = data.set_index('Nationality')['Job_Achieved_Pct'].reindex(top) if data is not None else []
+            nationality_fig.add_trace(go.Bar(
+                name=names[position], y=top, x=list(values), orientation='h',
+                marker=dict(color=COMPARE_COLORS[position]),
+                hovertemplate='%{y}<br>%{x:.1f}% job achieved<extra></extra>'
+            ))
+    nationality_fig.update_layout(
+        title=dict(text='JOB ACHIEVED - NATIONALITY (TOP 10 OF A)', font=dict(size=11, color='#002E79')),
+        barmode='group',
+        xaxis_title='% of Job Achieved',
+        margin=dict(l=5, r=5, t=30, b=20),
+        height=420,
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        legend=dict(orientation='h', y=-0.12, font=dict(size=9)),
+        xaxis=dict(gridcolor='lightgray', title_font=dict(size=10), range=[0, 100], tickfont=dict(size=9)),
+        yaxis=dict(tickfont=dict(size=10))
+    )
+    
+    # KPIs, salary and employment rate as one table
+    labels = {'Visa_Applications': 'Visa applications', 'Post_Study_Work': 'Post-study work',
+              'Job_Placement': 'Job placement', 'Skilled_Visa': 'Skilled visa', 'PR_Grant': 'PR grant'}
+    rows = [compare_cells(labels[column], *[results['kpis'][p][column] if results['count'][p] else 0 for p in (0, 1)],
+                          'count') for column in kpi_columns]
+    if 'median_salary' in results:
+        rows.append(compare_cells('Median salary', side('median_salary', 0), side('median_salary', 1), 'salary'))
+        rows.append(compare_cells('Mean salary', side('mean_salary', 0), side('mean_salary', 1), 'salary'))
+    if 'employment' in results:
+        rows.append(compare_cells('Employment rate', side('employment', 0), side('employment', 1), 'rate'))
+    kpi_table = html.Table([
+        html.Thead(html.Tr([html.Th(''), html.Th('A'), html.Th('B'), html.Th('B vs A')])),
+        html.Tbody(rows)
+    ], style={'width': '100%', 'fontSize': '11px', 'color': '#002E79'})
+    kpi_panel = [html.Div(names[0], style={'fontSize': '10px'}), html.Div(names[1], style={'fontSize': '10px'}),
+                 kpi_table]
+    
+    # Gender and migration reasons as shares of each selection's students
+    def share_figure(name, key, title, height):
+        fig = go.Figure()
+        for position in (0, 1):
+            data = side(name, position)
+            if data is None:
+                continue
+            total = data['Student_Count'].sum()
+            fig.add_trace(go.Bar(
+                name=names[position], y=data[key], orientation='h',
+                x=data['Student_Count'] / total * 100 if total else data['Student_Count'] * 0,
+                marker=dict(color=COMPARE_COLORS[position]),
+                hovertemplate='%{y}<br>%{x:.1f}% of students<extra></extra>'
+            ))
+        fig.update_layout(
+            title=dict(text=title, font=dict(size=11, color='#002E79')),
+            barmode='group',
+            showlegend=False,
+            margin=dict(l=5, r=5, t=30, b=20),
+            height=height,
+            plot_bgcolor='white',
+            paper_bgcolor='white',
+            xaxis=dict(gridcolor='lightgray', ticksuffix='%', tickfont=dict(size=9)),
+            yaxis=dict(tickfont=dict(size=10))
+        )
+        return fig
+    
+    gender_fig = share_figure('gender', 'Gender', 'GENDER RATIO', 170)
+    migration_fig = share_figure('migration', 'Migration_Reason', 'GRADUATES LEAVING AUSTRALIA - REASONS', 250)
+    
+    return nationality_fig, kpi_panel, gender_fig, migration_fig
+
+
+# Callback for one page of the row explorer
+@app.callback(
+    [Output('row-table', 'data'),
+     Output('row-table', 'page_count'),
+     Output('row-table', 'page_current'),
+     Output('row-summary', 'children')],
+    [Input('location-filter', 'value'),
+     Input('industry-filter-all', 'value'),
+     Input('industry-filter1', 'value'),
+     Input('industry-filter2', 'value'),
+     Input('industry-filter3', 'value'),
+     Input('industry-filter4', 'value'),
+     Input('study-filter', 'value'),
+     Input('study-filter2', 'value'),
+     Input('study-filter3', 'value'),
+     Input('employment-filter', 'value'),
+     Input('employment-filter2', 'value'),
+     Input('year-filter', 'value'),
+     Input('row-table', 'page_current'),
+     Input('row-table', 'page_size'),
+     Input('row-table', 'sort_by'),
+     Input('row-table', 'filter_query')],
+    [State('url', 'search')])
+def update_row_table(loc_all, ind_all, ind1, ind2, ind3, ind4,
+                     study1, study2, study3, emp1, emp2, years_filter,
+                     page_current, page_size, sort_by, filter_query, search=None):
+    
+    dataset = current_dataset(search)
+    if dataset.explorer is None:
+        return [], 1, 0, 'Rows are not kept in memory with this backend; use DOWNLOAD ROWS instead'
+    
+    selection = read_selection(loc_all, ind_all, ind1, ind2, ind3, ind4,
+                               study1, study2, study3, emp1, emp2, years_filter)
+    # Anything but a page change starts again from the first page
+    if 'row-table.page_current' not in ctx.triggered_prop_ids:
+        page_current = 0
+    page_current, page_size = page_current or 0, page_size or ROW_PAGE_SIZE
+    column, descending = (sort_by[0]['column_id'], sort_by[0]['direction'] == 'desc') if sort_by else (None, False)
+    
+    rows, total = dataset.explorer.page(selection, page_current, page_size, column, descending, filter_query)
+    
+    first = page_current * page_size + 1
+    if not len(rows):
+        summary = 'No matching rows'
+    elif total is None:
+        summary = f"Rows {first:,}-{first + len(rows) - 1:,}"
+    else:
+        summary = f"Rows {first:,}-{first + len(rows) - 1:,} of {total:,}"
+    page_count = max(-(-total // page_size), 1) if total is not None else None
+    
+    return rows.to_dict('records'), page_count, page_current, summary
+
+
 if __name__ == '__main__':
     app.run(debug=True)
 
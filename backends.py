@@ -0,0 +1,371 @@
+"""Query backends answering the dashboard's aggregates.
+
+The callbacks never touch a DataFrame directly; they describe the current
+filters as a selection (see make_selection) and ask the backend for the
+handful of aggregates each panel needs: column totals, grouped sums and
+means, the mean and median of a column, and the number of rows.
+
+QueryBackend documents the interface. DataFrameBackend answers from rows in
+memory, CubeBackend from pre-aggregated cells (ingest.py), ParallelBackend
+from a process pool (parallel.py) and SQLiteBackend from an indexed on-disk
+database (sqlite_backend.py).
+"""
+import numpy as np
+import pandas as pd
+
+FILTER_DIMENSIONS = ['State', 'Industry', 'Study_Level', 'Employment_Type', 'Year']
+
+
+def make_selection(locations, industries_filter, study_levels, employment_types, years_filter):
+    """Normalize the callback filter lists into a selection dict (None means all values)
+
+    An empty list means all values, except for years: with no year ticked the
+    selection is empty, as the year checklist has no separate ALL box to fall
+    back on. years_filter=None still means all years.
+    """
+    def values(filter_values):
+        if not filter_values or 'ALL' in filter_values:
+            return None
+        return tuple(sorted(set(filter_values)))
+
+    if years_filter is None or 'ALL' in years_filter:
+        years = None
+    else:
+        years = tuple(sorted({int(y) for y in years_filter}))
+    return {
+        'State': values(locations),
+        'Industry': values(industries_filter),
+        'Study_Level': values(study_levels),
+        'Employment_Type': values(employment_types),
+        'Year': years,
+    }
+
+
+def selection_key(selection):
+    """Hashable key for a selection"""
+    return tuple(selection.get(dimension) for dimension in FILTER_DIMENSIONS)
+
+
+def selection_mask(frame, selection):
+    """Boolean mask of the rows of a DataFrame in a selection"""
+    mask = np.ones(len(frame), dtype=bool)
+    for dimension in FILTER_DIMENSIONS:
+        values = selection.get(dimension)
+        if values is not None and dimension in frame.columns:
+            mask &= frame[dimension].isin(values).to_numpy()
+    return mask
+
+
+class QueryBackend:
+    """Interface every backend implements
+
+    columns lists the survey columns the backend can answer for, so panels
+    can fall back to placeholder data when a column is missing.
+    """
+
+    columns = []
+
+    def values(self, dimension):
+        """Sorted distinct values of a dimension column"""
+        raise NotImplementedError
+
+    def filter(self, selection):
+        """Rows matching a selection, as a DataFrame"""
+        raise NotImplementedError
+
+    def iter_rows(self, selection, chunksize):
+        """Survey rows matching a selection as DataFrames, scanning chunksize rows at a time
+
+        Yields one (possibly empty) frame per scanned chunk, so the matching
+        rows are never all in memory at once.
+        """
+        raise NotImplementedError
+
+    def count(self, selection):
+        """Number of survey rows in the selection"""
+        raise NotImplementedError
+
+    def total(self, selection, columns):
+        """Sum of each column over the selection"""
+        raise NotImplementedError
+
+    def count_by(self, selection, by, column=None):
+        """Number of survey rows per group, as a DataFrame with the group columns and Rows
+
+        With column, only the rows where that column is not missing are counted.
+        """
+        raise NotImplementedError
+
+    def sum_by(self, selection, by, column):
+        """Sum of a column per group, as a DataFrame with the group columns"""
+        raise NotImplementedError
+
+    def mean_by(self, selection, by, column):
+        """Mean of a column per group, as a DataFrame with the group columns"""
+        raise NotImplementedError
+
+    def mean(self, selection, column):
+        """Mean of a column over the selection"""
+        raise NotImplementedError
+
+    def median(self, selection, column):
+        """Median of a column over the selection"""
+        raise NotImplementedError
+
+    def memory_usage(self):
+        """Estimated bytes of data the backend holds in this process"""
+        raise NotImplementedError
+
+    def compare(self, selections, queries):
+        """Answer the same queries for several selections at once
+
+        queries maps a name to a method and its arguments after the selection,
+        e.g. {'gender': ('sum_by', (['Gender'], 'Student_Count'))}. Returns the
+        results by name, as a list with one result per selection. This version
+        asks each selection in turn; backends holding rows answer in one pass.
+        """
+        return {name: [getattr(self, method)(selection, *args) for selection in selections]
+                for name, (method, args) in queries.items()}
+
+
+class DataFrameBackend(QueryBackend):
+    """Answers the dashboard queries from an in-memory DataFrame of survey rows"""
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.columns = list(frame.columns)
+        self._last_filter = (None, None)
+        self._codes = {}
+        self._cells = None
+
+    def values(self, dimension):
+        return sorted(self.frame[dimension].dropna().unique().tolist())
+
+    def mask(self, selection):
+        """Boolean row mask for a selection"""
+        return selection_mask(self.frame, selection)
+
+    def filter(self, selection):
+        # Panels ask several questions about the same selection in a row
+        key = selection_key(selection)
+        last_key, last_frame = self._last_filter
+        if key == last_key:
+            return last_frame
+        filtered = self.frame[self.mask(selection)]
+        self._last_filter = (key, filtered)
+        return filtered
+
+    def iter_rows(self, selection, chunksize):
+        for start in range(0, len(self.frame), chunksize):
+            block = self.frame.iloc[start:start + chunksize]
+            yield block[selection_mask(block, selection)]
+
+    def count(self, selection):
+        return len(self.filter(selection))
+
+    def total(self, selection, columns):
+        sums = self.filter(selection)[columns].sum()
+        return {column: sums[column] for column in columns}
+
+    def count_by(self, selection, by, column=None):
+        grouped = self.filter(selection).groupby(by, observed=True)
+        counts = grouped.size() if column is None else grouped[column].count()
+        return counts.rename('Rows').reset_index()
+
+    def sum_by(self, selection, by, column):
+        return self.filter(selection).groupby(by, observed=True)[column].sum().reset_index()
+
+    def mean_by(self, selection, by, column):
+        return self.filter(selection).groupby(by, observed=True)[column].mean().reset_index()
+
+    def mean(self, selection, column):
+        return self.filter(selection)[column].mean()
+
+    def median(self, selection, column):
+        return self.filter(selection)[column].median()
+
+    def _group_codes(self, by):
+        """Code of each row's group, numbered in sorted group order, and the groups
+
+        Rows missing any of the group values get -1, as groupby leaves them out.
+        """
+        key = tuple(by)
+        if key not in self._codes:
+            codes = np.zeros(len(self.frame), dtype=np.int64)
+            missing = np.zeros(len(self.frame), dtype=bool)
+            levels = []
+            for column in by:
+                column_codes, uniques = pd.factorize(self.frame[column], sort=True)
+                codes = codes * len(uniques) + column_codes
+                missing |= column_codes < 0
+                levels.append(uniques)
+            codes[missing] = -1
+            self._codes[key] = (codes, levels)
+        return self._codes[key]
+
+    def _filter_cells(self):
+        """Filter cell (combination of filter dimension values) of each row, and the cells"""
+        if self._cells is None:
+            dimensions = [d for d in FILTER_DIMENSIONS if d in self.columns]
+            if dimensions:
+                cell_ids, cells = pd.MultiIndex.from_frame(self.frame[dimensions]).factorize()
+                self._cells = (cell_ids, pd.DataFrame(list(cells), columns=dimensions))
+            else:
+                self._cells = (np.zeros(len(self.frame), dtype=np.int64), pd.DataFrame(index=[0]))
+        return self._cells
+
+    def compare(self, selections, queries):
+        # Selections are matched against the few filter cells, not the rows: each cell gets
+        # one bit per selection holding it, and a single gather over the rows' cell ids
+        # tags every row with all its selections at once. Every query then runs once over
+        # the selected rows, counting by (selection, group) with bincount
+        if len(selections) > 63:
+            return QueryBackend.compare(self, selections, queries)
+        cell_ids, cells = self._filter_cells()
+        cell_bits = np.zeros(len(cells), dtype=np.int64)
+        for side, selection in enumerate(selections):
+            cell_bits |= selection_mask(cells, selection).astype(np.int64) << side
+        row_bits = cell_bits[cell_ids]
+        masks = [(row_bits >> side) & 1 == 1 for side in range(len(selections))]
+        rows = np.concatenate([np.flatnonzero(mask) for mask in masks])
+        sides = np.repeat(np.arange(len(masks)), [int(mask.sum()) for mask in masks])
+        count = len(selections)
+        rows_per_side = np.bincount(sides, minlength=count)
+
+        def sums(column, keys, size, rows=rows):
+            series = self.frame[column]
+            values = series.to_numpy(np.float64)[rows]
+            present = ~np.isnan(values)
+            totals = np.bincount(keys, weights=np.where(present, values, 0), minlength=size)
+            if pd.api.types.is_integer_dtype(series):
+                totals = totals.astype(np.int64)
+            return totals, np.bincount(keys, weights=present, minlength=size)
+
+        results = {}
+        for name, (method, args) in queries.items():
+            if method == 'count':
+                results[name] = [int(n) for n in rows_per_side]
+            elif method == 'total':
+                columns = {column: sums(column, sides, count)[0] for column in args[0]}
+                results[name] = [{column: totals[side] for column, totals in columns.items()} for side in range(count)]
+            elif method == 'mean':
+                totals, present = sums(args[0], sides, count)
+                results[name] = [totals[side] / present[side] if present[side] else np.nan for side in range(count)]
+            elif method == 'median':
+                values = self.frame[args[0]].to_numpy(np.float64)[rows]
+                results[name] = [np.nanmedian(values[sides == side]) if rows_per_side[side] else np.nan
+                                 for side in range(count)]
+            elif method in ('sum_by', 'mean_by'):
+                by, column = args
+                codes, levels = self._group_codes(by)
+                size = int(np.prod([len(level) for level in levels]))
+                grouped = codes[rows] >= 0
+                keys = sides[grouped] * size + codes[rows[grouped]]
+                totals, present = sums(column, keys, count * size, rows[grouped])
+                groups = np.bincount(keys, minlength=count * size)
+                values = totals if method == 'sum_by' else np.where(present > 0, totals / np.maximum(present, 1), np.nan)
+                results[name] = []
+                for side in range(count):
+                    found = np.flatnonzero(groups[side * size:(side + 1) * size])
+                    table, rest = {}, found
+                    for column_name, level in zip(reversed(by), reversed(levels)):
+                        table[column_name] = level[rest % len(level)]
+                        rest = rest // len(level)
+                    table = {column_name: table[column_name] for column_name in by}
+                    table[column] = values[side * size + found]
+                    results[name].append(pd.DataFrame(table))
+            else:
+                results[name] = [getattr(self, method)(selection, *args) for selection in selections]
+        return results
+
+    def memory_usage(self):
+        return int(self.frame.memory_usage(deep=True).sum())
+
+
+def histogram_quantile(counts, bin_width, q=0.5):
+    """Quantile of a fixed-width histogram, interpolating within the bin
+
+    As pandas does for rows, the value at rank q (n - 1) is interpolated between
+    the values at the ranks on either side, so an even count's median averages
+    the two middle values even when they fall in distant bins.
+    """
+    total = counts.sum()
+    if total == 0:
+        return np.nan
+    cumulative = np.cumsum(counts)
+
+    def value_at(rank):
+        b = int(np.searchsorted(cumulative, rank, side='right'))
+        before = cumulative[b - 1] if b > 0 else 0
+        return (b + (rank - before + 0.5) / counts[b]) * bin_width
+
+    rank = q * (total - 1)
+    low, high = int(np.floor(rank)), int(np.ceil(rank))
+    return value_at(low) + (rank - low) * (value_at(high) - value_at(low))
+
+
+class CubeBackend(DataFrameBackend):
+    """Answers the dashboard queries from pre-aggregated cells (see ingest.py)
+
+    Each cube row is one combination of dimension values holding the summed
+    measures, a Rows count and <column>_Sum totals for the averaged columns.
+    Salaries are kept as a fixed-width histogram per filter cell, so the
+    median is accurate to within one bin. filter() returns matching cells
+    rather than survey rows; iter_rows() re-reads the rows from the source
+    CSV, when there is one.
+    """
+
+    def __init__(self, frame, mean_columns, salary_hist, salary_bin, source=None):
+        super().__init__(frame)
+        self.source = source
+        self.mean_columns = list(mean_columns)
+        self.salary_hist = salary_hist
+        self.salary_bin = salary_bin
+        self.columns = [c for c in frame.columns
+                        if not c.endswith(('_Sum', '_Count')) and c not in ('Rows', 'Salary_Cell')]
+        self.columns += self.mean_columns
+
+    def count(self, selection):
+        return int(self.filter(selection)['Rows'].sum())
+
+    def count_by(self, selection, by, column=None):
+        if column is None:
+            return super().sum_by(selection, by, 'Rows')
+        if column not in self.mean_columns:
+            raise ValueError(f'CubeBackend keeps no count of missing values for {column}')
+        return super().sum_by(selection, by, column + '_Count').rename(columns={column + '_Count': 'Rows'})
+
+    def iter_rows(self, selection, chunksize):
+        if self.source is None:
+            raise NotImplementedError('CubeBackend holds no survey rows and has no source CSV')
+        return (chunk[selection_mask(chunk, selection)] for chunk in pd.read_csv(self.source, chunksize=chunksize))
+
+    def sum_by(self, selection, by, column):
+        # Averaged columns are kept as <column>_Sum totals
+        if column in self.mean_columns:
+            return super().sum_by(selection, by, column + '_Sum').rename(columns={column + '_Sum': column})
+        return super().sum_by(selection, by, column)
+
+    def mean_by(self, selection, by, column):
+        # Divided by the non-missing values of the column, not all rows
+        sums = self.filter(selection).groupby(by, observed=True)[[column + '_Sum', column + '_Count', 'Rows']].sum()
+        sums = sums[sums['Rows'] > 0]
+        return (sums[column + '_Sum'] / sums[column + '_Count']).rename(column).reset_index()
+
+    def mean(self, selection, column):
+        filtered = self.filter(selection)
+        counted = filtered[column + '_Count'].sum()
+        return filtered[column + '_Sum'].sum() / counted if counted else np.nan
+
+    def compare(self, selections, queries):
+        # Cells are not rows, so the stacked pass does not apply
+        return QueryBackend.compare(self, selections, queries)
+
+    def median(self, selection, column):
+        if column != 'Salary':
+            raise ValueError(f'CubeBackend keeps no distribution for {column}')
+        cells = pd.unique(self.filter(selection)['Salary_Cell'])
+        return histogram_quantile(self.salary_hist[cells].sum(axis=0), self.salary_bin)
+
+    def memory_usage(self):
+        return super().memory_usage() + self.salary_hist.nbytes
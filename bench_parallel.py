@@ -0,0 +1,77 @@
+"""Scaling benchmark for the process-pool backend.
+
+Replicates the survey data --scale times, then times the queries behind one
+full dashboard refresh (all seven callbacks) for a few filter selections,
+first in-process with DataFrameBackend and then with ParallelBackend using
+1..N worker processes.
+
+Usage: python bench_parallel.py [--scale 50] [--max-workers 4] [--partition rows] [--repeat 5]
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from backends import DataFrameBackend
+from parallel import ParallelBackend
+
+KPI_COLUMNS = ['Visa_Applications', 'Post_Study_Work', 'Job_Placement', 'Skilled_Visa', 'PR_Grant']
+
+SELECTIONS = [
+    {},
+    {'State': ('NSW', 'VIC')},
+    {'Year': (2024,), 'Study_Level': ('PG-C',)},
+    {'Industry': ('Health', 'STEM'), 'Employment_Type': ('FT',)},
+]
+
+
+def refresh(backend, selection):
+    """Issue the same queries as one refresh of every dashboard panel"""
+    backend.total(selection, KPI_COLUMNS)
+    backend.sum_by(selection, ['State'], 'Student_Count')
+    backend.mean_by(selection, ['Nationality'], 'Job_Achieved_Pct')
+    if backend.count(selection) > 0:
+        backend.median(selection, 'Salary')
+        backend.mean(selection, 'Salary')
+        backend.mean(selection, 'Employment_Rate')
+    backend.sum_by(selection, ['Gender'], 'Student_Count')
+    backend.sum_by(selection, ['Migration_Reason', 'Gender'], 'Student_Count')
+
+
+def time_backend(backend, repeat):
+    """Median wall time in milliseconds of a refresh, over all selections"""
+    refresh(backend, SELECTIONS[0])
+    timings = []
+    for _ in range(repeat):
+        for selection in SELECTIONS:
+            # Different selections each time, so no mask is reused between refreshes
+            start = time.perf_counter()
+            refresh(backend, selection)
+            timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Scaling benchmark for ParallelBackend')
+    parser.add_argument('--scale', type=int, default=50, help='times to replicate the dataset')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    parser.add_argument('--partition', default='rows', help="'rows' or a column such as 'Year'")
+    parser.add_argument('--repeat', type=int, default=5)
+    options = parser.parse_args()
+
+    df = pd.read_csv('international students data.csv')
+    df = pd.concat([df] * options.scale, ignore_index=True)
+    print(f'{len(df):,} rows, {os.cpu_count()} CPUs, partition={options.partition}')
+    if options.max_workers > (os.cpu_count() or 1):
+        print(f'Only {os.cpu_count()} CPU(s): workers beyond that share cores, so their times show overhead, not scaling')
+
+    baseline = time_backend(DataFrameBackend(df), options.repeat)
+    print(f'in-process        {baseline:8.1f} ms')
+
+    for workers in range(1, options.max_workers + 1):
+        backend = ParallelBackend(df, workers, options.partition)
+        elapsed = time_backend(backend, options.repeat)
+        backend.close()
+        print(f'{workers:2d} worker(s)      {elapsed:8.1f} ms   {baseline / elapsed:5.2f}x')
@@ -0,0 +1,121 @@
+"""Benchmark of cache-affine against random routing.
+
+For each policy, starts --nodes app nodes with response caches behind
+router.Router and replays the same workload through it. --users concurrent
+users each view --views selections, firing every callback as the browser
+does when it opens a link to one. The selections are drawn from --selections
+distinct checklist states with Zipf-like popularity, so a few views are very
+common and most are rare, as on a public dashboard. Reports the response
+cache hit rate over all nodes (from their /_routing counters) and the
+callback latency percentiles.
+
+Usage: python bench_routing.py [--nodes 3] [--users 12] [--views 20] [--selections 300]
+                               [--cache 256] [--zipf 1.1] [--json results.json]
+"""
+import argparse
+import copy
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from loadtest import BROWSER_CONNECTIONS, DashClient, free_port, initial_values
+from router import Router, start_nodes, stop_nodes
+
+
+def make_selections(dependencies, initial, count, seed):
+    """count distinct checklist states, each a few random toggles away from the initial one"""
+    random.seed(seed)
+    selections, seen = [], set()
+    while len(selections) < count:
+        client = DashClient('', dependencies, initial, {}, threading.Lock())
+        for _ in range(random.randint(1, 5)):
+            client.toggle()
+        key = json.dumps(client.values, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            selections.append(client.values)
+    return selections
+
+
+def simulate_user(base_url, dependencies, initial, selections, weights, options, seed, latencies, lock):
+    client = DashClient(base_url, dependencies, initial, latencies, lock)
+    rng = random.Random(seed)
+    with ThreadPoolExecutor(BROWSER_CONNECTIONS) as executor:
+        for _ in range(options.views):
+            client.values = copy.deepcopy(selections[rng.choices(range(len(selections)), weights)[0]])
+            # Each view opens a shared link to the selection, so every callback fires as on page load
+            client.fire_all(executor, [])
+
+
+def run_policy(policy, options):
+    urls, processes = start_nodes(options.nodes, options.threads, options.cache)
+    router = Router(urls, policy)
+    port = free_port()
+    server = router.serve(port)
+    base_url = f'http://127.0.0.1:{port}'
+    latencies, lock = {}, threading.Lock()
+    try:
+        dependencies = [dep for dep in requests.get(base_url + '/_dash-dependencies').json()
+                        if not dep.get('clientside_function')]
+        initial = initial_values(requests.get(base_url + '/_dash-layout').json())
+        initial['url.search'] = ''
+        selections = make_selections(dependencies, initial, options.selections, options.seed)
+        weights = [1 / rank ** options.zipf for rank in range(1, len(selections) + 1)]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options.users) as users:
+            for future in [users.submit(simulate_user, base_url, dependencies, initial, selections, weights,
+                                        options, options.seed + user, latencies, lock)
+                           for user in range(options.users)]:
+                future.result()
+        elapsed = time.perf_counter() - started
+        node_stats = [requests.get(url + '/_routing').json() for url in urls]
+    finally:
+        server.shutdown()
+        stop_nodes(processes)
+
+    errors = latencies.pop('errors', [])
+    values = [v for name, samples in latencies.items() for v in samples]
+    hits = sum(s['hits'] for s in node_stats)
+    lookups = hits + sum(s['misses'] for s in node_stats)
+    return {
+        'policy': policy, 'nodes': options.nodes, 'requests': len(values), 'errors': len(errors),
+        'elapsed_s': elapsed, 'hit_rate': hits / lookups if lookups else 0.0,
+        'cached_entries': sum(s['entries'] for s in node_stats),
+        'latency_ms': {p: float(np.percentile(values, p)) for p in (50, 95, 99)},
+        'routed': list(router.routed.values()),
+    }
+
+
+def print_report(reports):
+    print(f"{'policy':<10}{'requests':>9}{'errors':>8}{'hit rate':>10}{'entries':>9}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'time s':>8}  per node")
+    for r in reports:
+        print(f"{r['policy']:<10}{r['requests']:>9}{r['errors']:>8}{r['hit_rate']:>10.1%}{r['cached_entries']:>9}"
+              f"{r['latency_ms'][50]:>9.1f}{r['latency_ms'][95]:>9.1f}{r['latency_ms'][99]:>9.1f}"
+              f"{r['elapsed_s']:>8.1f}  {r['routed']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cache-affine against random routing')
+    parser.add_argument('--nodes', type=int, default=3, help='app nodes behind the proxy')
+    parser.add_argument('--threads', type=int, default=4, help='threads per app node')
+    parser.add_argument('--users', type=int, default=12, help='concurrent simulated users')
+    parser.add_argument('--views', type=int, default=20, help='selections viewed per user')
+    parser.add_argument('--selections', type=int, default=300, help='distinct selections in the workload')
+    parser.add_argument('--zipf', type=float, default=1.1, help='popularity skew of the selections')
+    parser.add_argument('--cache', type=int, default=256, help='responses cached per node')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='also write the report to this file')
+    options = parser.parse_args()
+
+    reports = [run_policy(policy, options) for policy in ('random', 'affinity')]
+    print_report(reports)
+    if options.json:
+        with open(options.json, 'w') as f:
+            json.dump(reports, f, indent=2)
@@ -0,0 +1,195 @@
+"""Serving several survey datasets from one app process.
+
+Each dataset is a CSV file picked by name in the page URL (?dataset=<name>).
+DatasetCache loads a dataset the first time it is asked for and keeps the
+loaded datasets in least-recently-used order. When their estimated memory
+goes over the budget, the least recently used ones are dropped (and their
+worker pools closed) until it fits again. Sizes are measured again on every
+use, so the sort indexes the row explorer builds lazily count too. The dataset just requested is
+never dropped, so a single dataset larger than the budget still works. It
+just stays alone in the cache. A dropped dataset that a request is still
+querying is closed when the last such request releases it.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from backends import CubeBackend, DataFrameBackend
+from row_explorer import RowExplorer
+from sampling import SampleBackend
+from trends import YearPrefixSums
+
+DEFAULT_DATASET = 'default'
+
+
+def dataset_paths(default_path, data_dir=None):
+    """Dataset names and CSV paths: the bundled CSV plus every CSV in data_dir"""
+    paths = {DEFAULT_DATASET: default_path}
+    if data_dir:
+        for filename in sorted(os.listdir(data_dir)):
+            if filename.lower().endswith('.csv'):
+                name = re.sub(r'[^a-z0-9]+', '-', filename[:-4].lower()).strip('-')
+                paths.setdefault(name, os.path.join(data_dir, filename))
+    return paths
+
+
+def query_value(search, key, default=None):
+    """Value of a parameter in a URL query string such as '?dataset=2023-cohort&exact=1'"""
+    match = re.search(rf'(?:^|[?&]){key}=([^&]*)', search or '')
+    return match.group(1) if match else default
+
+
+def dataset_name(search):
+    """Dataset named in a URL query string"""
+    return query_value(search, 'dataset', DEFAULT_DATASET)
+
+
+class Dataset:
+    """A loaded dataset: its query backend and what the layout and trend view need
+
+    With sample_fraction set, sample is a SampleBackend for approximate answers.
+    explorer pages through the survey rows when the backend keeps them in memory.
+    """
+
+    def __init__(self, name, backend, sample_fraction=None):
+        self.name = name
+        self.backend = backend
+        self.sample = SampleBackend(backend, sample_fraction) if sample_fraction else None
+        self.states = backend.values('State') if 'State' in backend.columns else ['NSW', 'VIC', 'QLD', 'WA', 'SA', 'TAS', 'ACT', 'NT']
+        self.industries = backend.values('Industry') if 'Industry' in backend.columns else ['Health', 'STEM', 'Social Sc.', 'Design', 'Business', 'Education', 'Prof. Serv', 'Services']
+        self.years = backend.values('Year') if 'Year' in backend.columns else [2022, 2023, 2024]
+        self.year_sums = YearPrefixSums(backend) if 'Year' in backend.columns else None
+        # The cube holds aggregated cells, not rows
+        row_level = isinstance(backend, DataFrameBackend) and not isinstance(backend, CubeBackend)
+        self.explorer = RowExplorer(backend.frame) if row_level else None
+        self._fixed_size = None
+
+    def memory_usage(self):
+        """Estimated bytes held in this process, counting the sort indexes built so far"""
+        # Everything but the explorer's sort indexes is fixed once loaded, and slow to measure
+        if self._fixed_size is None:
+            prefix = self.year_sums.prefix.nbytes if self.year_sums is not None else 0
+            sample = self.sample.memory_usage() if self.sample is not None else 0
+            self._fixed_size = self.backend.memory_usage() + prefix + sample
+        explorer = self.explorer.memory_usage() if self.explorer is not None else 0
+        return self._fixed_size + explorer
+
+    def close(self):
+        if hasattr(self.backend, 'close'):
+            self.backend.close()
+
+
+class DatasetCache:
+    """Lazily loaded datasets, evicted least recently used first over a memory budget
+
+    loader(name, path) returns a Dataset. budget is in bytes; None means no limit.
+    A dataset taken with acquire() stays open until the matching release(), even
+    if it is evicted in between; get() is for callers that never close it.
+    """
+
+    def __init__(self, paths, loader, budget=None):
+        self.paths = paths
+        self.loader = loader
+        self.budget = budget
+        self.loads = 0
+        self.evictions = 0
+        self._loaded = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._loading = {}
+        # Datasets in use by how many callers, and the evicted ones to close once unused
+        self._users = {}
+        self._retired = set()
+
+    def names(self):
+        return list(self.paths)
+
+    def memory_usage(self):
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def get(self, name):
+        """The dataset called name (the default one if unknown), loading it if needed"""
+        return self._lookup(name, hold=False)
+
+    def acquire(self, name):
+        """As get(), but the dataset is not closed before release(dataset)"""
+        return self._lookup(name, hold=True)
+
+    def release(self, dataset):
+        with self._lock:
+            self._users[dataset] -= 1
+            if self._users[dataset]:
+                return
+            del self._users[dataset]
+            closing = dataset in self._retired
+            self._retired.discard(dataset)
+        if closing:
+            dataset.close()
+
+    def _hold(self, dataset, hold):
+        if hold:
+            self._users[dataset] = self._users.get(dataset, 0) + 1
+        return dataset
+
+    def _lookup(self, name, hold):
+        if name not in self.paths:
+            name = DEFAULT_DATASET
+        with self._lock:
+            dataset = self._loaded.get(name)
+            if dataset is not None:
+                self._loaded.move_to_end(name)
+                self._hold(dataset, hold)
+            else:
+                loading = self._loading.setdefault(name, threading.Lock())
+        if dataset is not None:
+            # Re-measured on every use, as the row explorer builds its sort indexes lazily
+            size = dataset.memory_usage()
+            with self._lock:
+                if self._loaded.get(name) is not dataset:
+                    return dataset
+                self._sizes[name] = size
+                evicted = self._evict(keep=name)
+            for old in evicted:
+                old.close()
+            return dataset
+
+        # Load outside the cache lock so other datasets keep being served; the
+        # per-name lock makes concurrent first requests share one load
+        with loading:
+            with self._lock:
+                if name in self._loaded:
+                    self._loaded.move_to_end(name)
+                    return self._hold(self._loaded[name], hold)
+            dataset = self.loader(name, self.paths[name])
+            size = dataset.memory_usage()
+            with self._lock:
+                self._loaded[name] = dataset
+                self._sizes[name] = size
+                self.loads += 1
+                self._hold(dataset, hold)
+                evicted = self._evict(keep=name)
+
+        for old in evicted:
+            old.close()
+        return dataset
+
+    def _evict(self, keep):
+        """Drop least recently used datasets until the rest fit the budget, returning those to close now
+
+        Datasets still in use are closed by the last release() instead.
+        """
+        evicted = []
+        if self.budget is None:
+            return evicted
+        while sum(self._sizes.values()) > self.budget and len(self._loaded) > 1:
+            name = next(n for n in self._loaded if n != keep)
+            dataset = self._loaded.pop(name)
+            del self._sizes[name]
+            self.evictions += 1
+            if dataset in self._users:
+                self._retired.add(dataset)
+            else:
+                evicted.append(dataset)
+        return evicted
@@ -0,0 +1,222 @@
+"""Pre-render dashboard views to static files.
+
+Computes all seven dashboard outputs (KPI cards, map, nationality ranking,
+salary, employment rate, gender ratio and migration reasons) for a set of
+filter selections and writes them as JSON next to a small page that loads
+them with plotly.js, so the common views can be served from any static file
+server without running Python per request.
+
+By default the default view plus every single-value selection of each filter
+dimension is exported. Pass --selections with a JSON file holding a list of
+selections to export a different set, e.g.
+
+    [{"State": ["NSW"], "Year": [2024]}, {"Industry": ["Health", "STEM"]}]
+
+Usage: python export_static.py [--out static_export] [--selections views.json]
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+
+import plotly
+
+import app
+from backends import FILTER_DIMENSIONS
+from static_assets import DIST_DIR, build_assets, stylesheet_urls
+
+FIGURE_OUTPUTS = [
+    ('australia-map', lambda *args: app.map_figure(app.state_counts(app.read_selection(*args)))),
+    ('nationality-chart', app.update_nationality),
+    ('employment-rate', app.update_employment_rate),
+    ('gender-ratio', app.update_gender_ratio),
+    ('migration-reasons', app.update_migration_reasons),
+]
+
+KPI_IDS = ['kpi-visa-apps', 'kpi-post-study', 'kpi-job-placement', 'kpi-skilled-visa', 'kpi-pr-grant']
+SALARY_IDS = ['median-salary', 'mean-salary']
+
+
+def default_selections():
+    """Default view plus every single-value selection per filter dimension"""
+    backend = app.current_dataset().backend
+    selections = [{}]
+    for dimension in FILTER_DIMENSIONS:
+        if dimension in backend.columns:
+            for value in backend.values(dimension):
+                selections.append({dimension: [value]})
+    return selections
+
+
+def callback_args(selection):
+    """Translate a selection dict into the positional callback arguments"""
+    def values(dimension):
+        return [str(v) if dimension == 'Year' else v for v in selection.get(dimension, [])]
+
+    locations = values('State') or ['ALL']
+    industries = values('Industry')
+    study_levels = values('Study_Level')
+    employment_types = values('Employment_Type')
+    years_filter = values('Year') or ['ALL']
+
+    return (locations,
+            [] if industries else ['ALL'], industries, [], [], [],
+            [] if study_levels else ['ALL'], study_levels, [],
+            [] if employment_types else ['ALL'], employment_types,
+            years_filter)
+
+
+def view_key(selection):
+    """Stable file-name key for a selection"""
+    if not selection:
+        return 'default'
+    parts = []
+    for dimension in FILTER_DIMENSIONS:
+        for value in selection.get(dimension, []):
+            parts.append(f'{dimension}-{value}')
+    return re.sub(r'[^a-z0-9]+', '-', '_'.join(parts).lower()).strip('-')
+
+
+def selection_label(selection):
+    """Human readable label for the view picker"""
+    if not selection:
+        return 'All students'
+    return ' | '.join(f"{dimension.replace('_', ' ')}: {', '.join(str(v) for v in selection[dimension])}"
+                      for dimension in FILTER_DIMENSIONS if selection.get(dimension))
+
+
+def render_view(selection):
+    """Compute every dashboard output for one selection"""
+    args = callback_args(selection)
+    view = {
+        'label': selection_label(selection),
+        'selection': selection,
+        'text': dict(zip(KPI_IDS + SALARY_IDS, list(app.update_kpis(*args)) + list(app.update_salary(*args)))),
+        'figures': {},
+    }
+    for output_id, callback in FIGURE_OUTPUTS:
+        view['figures'][output_id] = json.loads(callback(*args).to_json())
+    return view
+
+
+def export(out_dir, selections):
+    """Write the view JSON files, the view index and the static page"""
+    views_dir = os.path.join(out_dir, 'views')
+    os.makedirs(views_dir, exist_ok=True)
+
+    index = []
+    for selection in selections:
+        key = view_key(selection)
+        view = render_view(selection)
+        with open(os.path.join(views_dir, key + '.json'), 'w') as f:
+            json.dump(view, f, separators=(',', ':'))
+        index.append({'key': key, 'label': view['label']})
+        print(f'{key}: {view["label"]}')
+
+    with open(os.path.join(out_dir, 'views.json'), 'w') as f:
+        json.dump(index, f, indent=1)
+
+    # Copy the page dependencies so the export is self-contained
+    manifest = build_assets()
+    for name in manifest.values():
+        shutil.copy(os.path.join(DIST_DIR, name), out_dir)
+    plotly_js = os.path.join(os.path.dirname(plotly.__file__), 'package_data', 'plotly.min.js')
+    shutil.copy(plotly_js, out_dir)
+
+    stylesheets = '\n'.join(f'    <link rel="stylesheet" href="{url.split("/")[-1]}">'
+                            for url in stylesheet_urls(manifest))
+    with open(os.path.join(out_dir, 'index.html'), 'w') as f:
+        f.write(PAGE_TEMPLATE.replace('{%stylesheets%}', stylesheets))
+
+
+PAGE_TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>International Student Employability Dashboard - Australia</title>
+{%stylesheets%}
+    <script src="plotly.min.js"></script>
+    <style>
+        body { overflow: auto; font-family: Arial, sans-serif; }
+        .kpi { display: inline-block; width: 13%; margin: 2px; padding: 8px; text-align: center; border: 2px solid #000; }
+        .kpi-label { font-size: 9px; color: #666; font-weight: 600; }
+        .kpi-value { font-size: 24px; font-weight: bold; color: #002E79; }
+        .panel { display: inline-block; vertical-align: top; margin: 4px; }
+    </style>
+</head>
+<body>
+    <h1 style="text-align: center; color: white; margin: 0; padding: 12px; background-color: #002E79; font-size: 22px; font-weight: 700;">
+        INTERNATIONAL STUDENT EMPLOYABILITY DASHBOARD - AUSTRALIA</h1>
+    <div style="padding: 6px; text-align: center;">
+        <label class="filter-header" for="view-picker">VIEW</label>
+        <select id="view-picker"></select>
+    </div>
+    <div style="text-align: center;">
+        <div class="kpi"><div class="kpi-label">STUDENT VISA APPLICATIONS</div><div class="kpi-value" id="kpi-visa-apps"></div></div>
+        <div class="kpi"><div class="kpi-label">POST-STUDY WORK</div><div class="kpi-value" id="kpi-post-study"></div></div>
+        <div class="kpi"><div class="kpi-label">JOB PLACEMENT</div><div class="kpi-value" id="kpi-job-placement"></div></div>
+        <div class="kpi"><div class="kpi-label">SKILLED VISA APPLICATIONS</div><div class="kpi-value" id="kpi-skilled-visa"></div></div>
+        <div class="kpi"><div class="kpi-label">PR GRANT</div><div class="kpi-value" id="kpi-pr-grant"></div></div>
+        <div class="kpi"><div class="kpi-label">MEDIAN SALARY</div><div class="kpi-value" id="median-salary"></div></div>
+        <div class="kpi"><div class="kpi-label">MEAN SALARY</div><div class="kpi-value" id="mean-salary"></div></div>
+    </div>
+    <div style="text-align: center;">
+        <div class="panel chart-box" style="width: 36%;"><div id="australia-map"></div></div>
+        <div class="panel chart-box" style="width: 25%;"><div id="nationality-chart"></div></div>
+        <div class="panel" style="width: 30%;">
+            <div class="chart-box" style="width: 48%; display: inline-block;"><div id="employment-rate"></div></div>
+            <div class="chart-box" style="width: 48%; display: inline-block;"><div id="gender-ratio"></div></div>
+            <div class="chart-box"><div id="migration-reasons"></div></div>
+        </div>
+    </div>
+    <script>
+        var picker = document.getElementById('view-picker');
+        var config = {displayModeBar: false, responsive: true};
+
+        function showView(key) {
+            fetch('views/' + key + '.json').then(function (r) { return r.json(); }).then(function (view) {
+                Object.keys(view.text).forEach(function (id) {
+                    document.getElementById(id).textContent = view.text[id];
+                });
+                Object.keys(view.figures).forEach(function (id) {
+                    Plotly.react(id, view.figures[id].data, view.figures[id].layout, config);
+                });
+            });
+        }
+
+        fetch('views.json').then(function (r) { return r.json(); }).then(function (views) {
+            views.forEach(function (view) {
+                var option = document.createElement('option');
+                option.value = view.key;
+                option.textContent = view.label;
+                picker.appendChild(option);
+            });
+            var initial = window.location.hash.slice(1) || views[0].key;
+            picker.value = initial;
+            showView(initial);
+        });
+
+        picker.addEventListener('change', function () {
+            window.location.hash = picker.value;
+            showView(picker.value);
+        });
+    </script>
+</body>
+</html>
+'''
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pre-render dashboard views to static files')
+    parser.add_argument('--out', default='static_export', help='output directory')
+    parser.add_argument('--selections', help='JSON file with a list of selections to export')
+    options = parser.parse_args()
+
+    if options.selections:
+        with open(options.selections) as f:
+            selections = json.load(f)
+    else:
+        selections = default_selections()
+
+    export(options.out, selections)
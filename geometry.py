@@ -0,0 +1,78 @@
+"""Build-time simplification of the state boundary GeoJSON.
+
+static/geo/australia-states.geojson holds the eight state and territory
+outlines (decoded from the MIT-licensed echarts-countries-pypkg Australia map,
+with the external territories dropped), keyed by the State codes used in the
+survey data. simplify_geojson reduces them with Douglas-Peucker to a given
+tolerance in degrees, drops rings that collapse below it and winds the rings
+clockwise as plotly's d3-geo renderer expects.
+"""
+import numpy as np
+
+
+def _douglas_peucker(points, tolerance):
+    """Douglas-Peucker simplification of one closed ring"""
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        segment = points[last] - points[first]
+        offsets = points[first + 1:last] - points[first]
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.extend([(first, split), (split, last)])
+    return points[keep]
+
+
+def _signed_area(ring):
+    x, y = ring[:, 0], ring[:, 1]
+    return 0.5 * np.sum(x[:-1] * y[1:] - x[1:] * y[:-1])
+
+
+def simplify_ring(ring, tolerance, exterior=True):
+    """Simplified, correctly wound ring, or None if it collapses"""
+    points = _douglas_peucker(np.asarray(ring, dtype=float), tolerance)
+    if len(points) < 4 or abs(_signed_area(points)) < tolerance ** 2:
+        return None
+    # Exterior rings clockwise, holes counter-clockwise
+    if (_signed_area(points) > 0) == exterior:
+        points = points[::-1]
+    decimals = max(0, int(np.ceil(-np.log10(tolerance))) + 1) if tolerance > 0 else 6
+    return np.round(points, decimals).tolist()
+
+
+def simplify_geojson(collection, tolerance):
+    """Copy of a FeatureCollection of (Multi)Polygons simplified to a tolerance in degrees"""
+    features = []
+    for feature in collection['features']:
+        geometry = feature['geometry']
+        polygons = geometry['coordinates'] if geometry['type'] == 'MultiPolygon' else [geometry['coordinates']]
+
+        simplified = []
+        for polygon in polygons:
+            exterior = simplify_ring(polygon[0], tolerance)
+            if exterior is not None:
+                holes = [simplify_ring(hole, tolerance, exterior=False) for hole in polygon[1:]]
+                simplified.append([exterior] + [hole for hole in holes if hole is not None])
+
+        # Never lose a whole state: fall back to its largest polygon, unsimplified
+        if not simplified:
+            largest = max(polygons, key=lambda p: abs(_signed_area(np.asarray(p[0], dtype=float))))
+            simplified = [[simplify_ring(largest[0], 0)]]
+
+        features.append({
+            'type': 'Feature',
+            'properties': feature['properties'],
+            'geometry': {'type': 'MultiPolygon', 'coordinates': simplified},
+        })
+    return {'type': 'FeatureCollection', 'features': features}
@@ -0,0 +1,118 @@
+"""Out-of-core ingestion of the survey CSV into an aggregate cube.
+
+The CSV is streamed in fixed-size chunks. Each chunk's dimension columns are
+encoded to integer codes, the chunk is reduced to per-cell sums and row
+counts and folded into the running cube, and its salaries are added to a
+fixed-width histogram per filter cell. The full table is never held in
+memory: peak usage is one chunk plus the cube, whose size depends on the
+number of distinct dimension combinations rather than on the number of rows.
+
+Usage: python ingest.py [csv path] [--chunksize N] [--salary-bin DOLLARS]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from backends import FILTER_DIMENSIONS, CubeBackend
+
+DIMENSIONS = FILTER_DIMENSIONS + ['Nationality', 'Gender', 'Migration_Reason']
+SUM_COLUMNS = ['Student_Count', 'Visa_Applications', 'Post_Study_Work', 'Job_Placement',
+               'Skilled_Visa', 'PR_Grant', 'Left_Australia']
+MEAN_COLUMNS = ['Employment_Rate', 'Job_Achieved_Pct', 'Salary']
+
+DEFAULT_CHUNKSIZE = 100_000
+DEFAULT_SALARY_BIN = 250
+
+
+# Helper function to map a column onto stable integer codes; missing values get -1
+def _encode(values, vocabulary):
+    for value in pd.unique(values.dropna()):
+        if value not in vocabulary:
+            vocabulary[value] = len(vocabulary)
+    return values.map(vocabulary).fillna(-1).to_numpy(np.int32)
+
+
+def _grow(hist, rows, cols):
+    """Enlarge the histogram array, doubling so growth stays amortized"""
+    if rows <= hist.shape[0] and cols <= hist.shape[1]:
+        return hist
+    rows = hist.shape[0] if rows <= hist.shape[0] else max(rows, 2 * hist.shape[0])
+    cols = hist.shape[1] if cols <= hist.shape[1] else max(cols, 2 * hist.shape[1])
+    grown = np.zeros((rows, cols), dtype=hist.dtype)
+    grown[:hist.shape[0], :hist.shape[1]] = hist
+    return grown
+
+
+def build_cube(path, chunksize=DEFAULT_CHUNKSIZE, salary_bin=DEFAULT_SALARY_BIN):
+    """Stream a survey CSV into a CubeBackend without loading the whole table"""
+    vocabularies = {dimension: {} for dimension in DIMENSIONS}
+    cells = {}
+    hist = np.zeros((64, 256), dtype=np.int64)
+    cube = None
+
+    reader = pd.read_csv(path, chunksize=chunksize,
+                         usecols=lambda c: c in DIMENSIONS + SUM_COLUMNS + MEAN_COLUMNS)
+    for chunk in reader:
+        present = [d for d in DIMENSIONS if d in chunk.columns]
+        codes = pd.DataFrame({d: _encode(chunk[d], vocabularies[d]) for d in present})
+
+        # Fold the chunk into per-cell sums
+        measures = chunk[[c for c in SUM_COLUMNS if c in chunk.columns]].reset_index(drop=True)
+        # Averaged columns keep their count of non-missing values, as blanks add nothing to the sum
+        for column in MEAN_COLUMNS:
+            if column in chunk.columns:
+                measures[column + '_Sum'] = chunk[column].to_numpy(np.float64)
+                measures[column + '_Count'] = chunk[column].notna().to_numpy(np.int64)
+        measures['Rows'] = 1
+        part = pd.concat([codes, measures], axis=1).groupby(present, sort=False).sum()
+        cube = part if cube is None else pd.concat([cube, part]).groupby(level=present, sort=False).sum()
+
+        # Salary histogram per filter cell, for the median
+        if 'Salary' in chunk.columns:
+            keys = codes[[d for d in FILTER_DIMENSIONS if d in present]]
+            local, uniques = pd.MultiIndex.from_frame(keys).factorize()
+            cell_ids = np.array([cells.setdefault(key, len(cells)) for key in uniques], dtype=np.int64)[local]
+            salaries = chunk['Salary'].to_numpy(np.float64)
+            known = ~np.isnan(salaries)
+            bins = np.clip(salaries[known] // salary_bin, 0, None).astype(np.int64)
+            hist = _grow(hist, len(cells), int(bins.max()) + 1 if len(bins) else 0)
+            np.add.at(hist, (cell_ids[known], bins), 1)
+
+    frame = cube.reset_index()
+    filter_present = [d for d in FILTER_DIMENSIONS if d in frame.columns]
+    if cells:
+        keys = frame[filter_present].itertuples(index=False, name=None)
+        frame['Salary_Cell'] = [cells[key] for key in keys]
+    used_bins = np.flatnonzero(hist.any(axis=0))
+    hist = hist[:len(cells), :used_bins[-1] + 1 if len(used_bins) else 0]
+
+    # Decode the dimension codes back to their values, with sorted categories
+    # so grouped results come out in the same order as on the raw table. Cells
+    # of rows with a missing value keep it missing, so their rows still count
+    # in totals while grouping by that dimension leaves them out, as pandas does
+    for dimension in [d for d in DIMENSIONS if d in frame.columns]:
+        vocabulary = list(vocabularies[dimension])
+        codes = frame[dimension].to_numpy()
+        if dimension == 'Year':
+            values = np.asarray(vocabulary + [np.nan] if (codes < 0).any() else vocabulary)
+            frame[dimension] = values[codes]
+        else:
+            categories = sorted(vocabulary)
+            ranks = np.asarray([categories.index(value) for value in vocabulary] + [-1])
+            frame[dimension] = pd.Categorical.from_codes(ranks[codes], categories=categories)
+
+    mean_columns = [c for c in MEAN_COLUMNS if c + '_Sum' in frame.columns]
+    return CubeBackend(frame, mean_columns, hist, salary_bin, source=path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stream a survey CSV into an aggregate cube')
+    parser.add_argument('path', nargs='?', default='international students data.csv')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--salary-bin', type=int, default=DEFAULT_SALARY_BIN)
+    options = parser.parse_args()
+
+    backend = build_cube(options.path, options.chunksize, options.salary_bin)
+    print(f"{backend.frame['Rows'].sum()} rows -> {len(backend.frame)} cells, "
+          f'{backend.salary_hist.shape[0]} salary histograms x {backend.salary_hist.shape[1]} bins')
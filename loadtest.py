@@ -0,0 +1,330 @@
+"""End-to-end HTTP load test against a local gunicorn server.
+
+Starts `gunicorn app:server` on a free local port, then simulates concurrent
+users with real Dash callback requests: each user loads the page (index,
+layout and dependencies, then every callback fired together, as the
+browser does), and then performs bursts of checklist toggles, each of which
+fires the callbacks taking the toggled checklists as input again. The callback payloads
+are built from /_dash-dependencies, starting from the component values in
+/_dash-layout, so they go through Dash's own request parsing, callback
+dispatch and JSON serialization.
+
+Reports throughput, p50/p95/p99 latency per callback output, how many
+callbacks the server's admission control served from cache or shed, and the
+CPU and resident memory of each gunicorn worker, sampled from /proc (Linux
+only).
+
+Usage: python loadtest.py [--users 20] [--workers 2] [--threads 4] [--bursts 3]
+                          [--toggles 4] [--think 0.2] [--dataset NAME] [--json results.json]
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+# Checklist options a user can toggle, as laid out in app.py
+TOGGLES = {
+    'location-filter': ['TAS', 'VIC', 'NSW', 'NT', 'SA', 'WA', 'QLD', 'ACT'],
+    'industry-filter1': ['Health', 'STEM'],
+    'industry-filter2': ['Social Sc.', 'Design'],
+    'industry-filter3': ['Business', 'ED.'],
+    'industry-filter4': ['Prof. Serv', 'SERV.'],
+    'study-filter2': ['PG-C'],
+    'study-filter3': ['PG-R'],
+    'employment-filter2': ['PT', 'CAS'],
+    'year-filter': ['2022', '2023', '2024'],
+}
+# The checklist holding the ALL box of each filter group
+ALL_BOX = {
+    'location-filter': 'location-filter',
+    'industry-filter1': 'industry-filter-all',
+    'industry-filter2': 'industry-filter-all',
+    'industry-filter3': 'industry-filter-all',
+    'industry-filter4': 'industry-filter-all',
+    'study-filter2': 'study-filter',
+    'study-filter3': 'study-filter',
+    'employment-filter2': 'employment-filter',
+    'year-filter': 'year-filter',
+}
+
+# Browsers open at most this many connections per host
+BROWSER_CONNECTIONS = 6
+
+
+def initial_values(layout):
+    """Starting value of every property of the components in a /_dash-layout tree, by 'id.property'"""
+    values = {}
+    stack = [layout]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, dict):
+            props = node.get('props', {})
+            if isinstance(props.get('id'), str):
+                values.update((f"{props['id']}.{name}", value) for name, value in props.items())
+            stack.extend(v for v in props.values() if isinstance(v, (dict, list)))
+    return values
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, workers, threads, env=None):
+    """Launch gunicorn and wait until it answers"""
+    command = [sys.executable, '-m', 'gunicorn', 'app:server', '--bind', f'127.0.0.1:{port}',
+               '--workers', str(workers), '--threads', str(threads), '--log-level', 'warning']
+    server = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)),
+                              env=dict(os.environ, **(env or {})))
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError('gunicorn exited during start-up')
+        try:
+            requests.get(f'http://127.0.0.1:{port}/', timeout=5)
+            return server
+        except requests.RequestException:
+            time.sleep(0.25)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start within 120 s')
+
+
+def worker_pids(master_pid):
+    """PIDs of the gunicorn workers forked by the master"""
+    pids = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    fields = f.read().rsplit(')', 1)[1].split()
+            except OSError:
+                continue
+            if int(fields[1]) == master_pid:
+                pids.append(int(entry))
+    return pids
+
+
+class ResourceSampler(threading.Thread):
+    """Samples CPU time and RSS of the gunicorn workers in the background"""
+
+    def __init__(self, master_pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.master_pid = master_pid
+        self.interval = interval
+        self.samples = {}
+        self.stopped = threading.Event()
+        self.ticks = os.sysconf('SC_CLK_TCK')
+        self.page_size = os.sysconf('SC_PAGE_SIZE')
+
+    def read(self, pid):
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/statm') as f:
+            rss_pages = int(f.read().split()[1])
+        return (int(fields[11]) + int(fields[12])) / self.ticks, rss_pages * self.page_size
+
+    def run(self):
+        while not self.stopped.is_set():
+            now = time.time()
+            for pid in worker_pids(self.master_pid):
+                try:
+                    self.samples.setdefault(pid, []).append((now,) + self.read(pid))
+                except OSError:
+                    pass
+            self.stopped.wait(self.interval)
+
+    def summary(self):
+        """Mean CPU % and peak RSS per worker over the sampled window"""
+        result = {}
+        for pid, samples in self.samples.items():
+            if len(samples) > 1:
+                (t0, cpu0, _), (t1, cpu1, _) = samples[0], samples[-1]
+                result[pid] = {'cpu_pct': 100 * (cpu1 - cpu0) / (t1 - t0),
+                               'peak_rss_mb': max(s[2] for s in samples) / 2 ** 20}
+        return result
+
+
+class DashClient:
+    """Builds and sends Dash callback requests for one simulated user"""
+
+    def __init__(self, base_url, dependencies, initial, latencies, lock):
+        self.base_url = base_url
+        self._local = threading.local()
+        self.dependencies = dependencies
+        self.latencies = latencies
+        self.lock = lock
+        self.values = {self.prop(item): copy.deepcopy(initial.get(self.prop(item), []))
+                       for dep in dependencies for item in dep['inputs'] + dep['state']}
+
+    @staticmethod
+    def prop(item):
+        return f"{item['id']}.{item['property']}"
+
+    @property
+    def session(self):
+        # One keep-alive connection per browser connection slot
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def record(self, name, started, ok, degraded=None):
+        with self.lock:
+            self.latencies.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+            if not ok:
+                self.latencies.setdefault('errors', []).append(name)
+            if degraded:
+                self.latencies.setdefault(degraded, []).append(name)
+
+    def get(self, path):
+        started = time.perf_counter()
+        try:
+            response = self.session.get(self.base_url + path)
+        except requests.RequestException:
+            self.record('GET ' + path, started, False)
+            return
+        self.record('GET ' + path, started, response.ok)
+
+    def payload(self, dep, changed):
+        outputs = [dict(zip(('id', 'property'), part.rsplit('.', 1)))
+                   for part in dep['output'].strip('.').split('...')]
+        return {
+            'output': dep['output'],
+            'outputs': outputs if dep['output'].startswith('..') else outputs[0],
+            'inputs': [{'id': i['id'], 'property': i['property'], 'value': self.values[self.prop(i)]}
+                       for i in dep['inputs']],
+            'changedPropIds': [prop for prop in changed if prop in {self.prop(i) for i in dep['inputs']}],
+            'state': [{'id': s['id'], 'property': s['property'], 'value': self.values[self.prop(s)]}
+                      for s in dep['state']],
+        }
+
+    def fire(self, dep, changed):
+        name = dep['output'].strip('.').split('...')[0]
+        started = time.perf_counter()
+        try:
+            response = self.session.post(self.base_url + '/_dash-update-component', json=self.payload(dep, changed))
+        except requests.RequestException:
+            # Connection reset, e.g. a worker killed by gunicorn's timeout
+            self.record(name, started, False)
+            return
+        self.record(name, started, response.ok, response.headers.get('X-Admission'))
+
+    def fire_all(self, executor, changed):
+        """Fire the callbacks with a changed input at once, as the renderer does; all of them on page load"""
+        fired = [dep for dep in self.dependencies
+                 if not changed or any(self.prop(i) in changed for i in dep['inputs'])]
+        for future in [executor.submit(self.fire, dep, changed) for dep in fired]:
+            future.result()
+
+    def toggle(self):
+        """Tick or untick a random checklist option, keeping the ALL boxes consistent"""
+        component_id = random.choice(list(TOGGLES))
+        option = random.choice(TOGGLES[component_id])
+        values = self.values[component_id + '.value']
+        changed = [component_id + '.value']
+        if option in values:
+            values.remove(option)
+        else:
+            values.append(option)
+            if 'ALL' in self.values[ALL_BOX[component_id] + '.value']:
+                self.values[ALL_BOX[component_id] + '.value'].remove('ALL')
+                changed.append(ALL_BOX[component_id] + '.value')
+        return sorted(set(changed))
+
+
+def simulate_user(base_url, dependencies, initial, options, latencies, lock):
+    client = DashClient(base_url, dependencies, initial, latencies, lock)
+    with ThreadPoolExecutor(BROWSER_CONNECTIONS) as executor:
+        client.get('/')
+        client.get('/_dash-layout')
+        client.get('/_dash-dependencies')
+        client.fire_all(executor, [])
+        for _ in range(options.bursts):
+            for _ in range(options.toggles):
+                client.fire_all(executor, client.toggle())
+                time.sleep(random.uniform(0, options.think))
+            time.sleep(options.think * 5)
+
+
+def run(options):
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    server = start_server(port, options.workers, options.threads)
+    sampler = ResourceSampler(server.pid)
+    latencies, lock = {}, threading.Lock()
+    try:
+        # Clientside callbacks run in the browser and never reach the server
+        dependencies = [dep for dep in requests.get(base_url + '/_dash-dependencies').json()
+                        if not dep.get('clientside_function')]
+        initial = initial_values(requests.get(base_url + '/_dash-layout').json())
+        initial['url.search'] = f'?dataset={options.dataset}' if options.dataset else ''
+        sampler.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options.users) as users:
+            for future in [users.submit(simulate_user, base_url, dependencies, initial, options, latencies, lock)
+                           for _ in range(options.users)]:
+                future.result()
+        elapsed = time.perf_counter() - started
+    finally:
+        sampler.stopped.set()
+        server.terminate()
+        server.wait()
+
+    errors = latencies.pop('errors', [])
+    # Callbacks the server's admission control answered from cache or shed
+    degraded = {kind: len(latencies.pop(kind, [])) for kind in ('cached', 'shed')}
+    requests_sent = sum(len(v) for v in latencies.values())
+    report = {
+        'users': options.users, 'workers': options.workers, 'threads': options.threads,
+        'elapsed_s': elapsed, 'requests': requests_sent, 'errors': len(errors), 'degraded': degraded,
+        'throughput_rps': requests_sent / elapsed,
+        'latency_ms': {name: {'count': len(values),
+                              'p50': float(np.percentile(values, 50)),
+                              'p95': float(np.percentile(values, 95)),
+                              'p99': float(np.percentile(values, 99))}
+                       for name, values in sorted(latencies.items())},
+        'workers_usage': sampler.summary(),
+    }
+    return report
+
+
+def print_report(report):
+    print(f"{report['users']} users, {report['workers']} workers x {report['threads']} threads: "
+          f"{report['requests']} requests in {report['elapsed_s']:.1f} s = {report['throughput_rps']:.1f} req/s, "
+          f"{report['errors']} errors, {report['degraded']['cached']} cached, {report['degraded']['shed']} shed")
+    print(f"{'output':<32}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in report['latency_ms'].items():
+        print(f"{name:<32}{stats['count']:>7}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}")
+    for pid, usage in sorted(report['workers_usage'].items()):
+        print(f"worker {pid}: {usage['cpu_pct']:.0f}% CPU, peak RSS {usage['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='HTTP load test of the dashboard under gunicorn')
+    parser.add_argument('--users', type=int, default=20, help='concurrent simulated users')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='threads per gunicorn worker')
+    parser.add_argument('--bursts', type=int, default=3, help='toggle bursts per user')
+    parser.add_argument('--toggles', type=int, default=4, help='checklist toggles per burst')
+    parser.add_argument('--think', type=float, default=0.2, help='max pause between toggles, seconds')
+    parser.add_argument('--dataset', help='dataset to request, as in ?dataset=<name>')
+    parser.add_argument('--json', help='also write the report to this file')
+    options = parser.parse_args()
+
+    report = run(options)
+    print_report(report)
+    if options.json:
+        with open(options.json, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,131 @@
+"""Local stand-in for a cache-affine front proxy.
+
+Starts --nodes app nodes, each a one-worker gunicorn process with its own
+response cache (DASHBOARD_RESPONSE_CACHE), and a threaded HTTP proxy in front
+of them. With --policy affinity each callback request goes to the node picked
+by rendezvous hashing of its route key: the X-Selection-Key header the page
+sends, or the key computed from the request body when the header is missing.
+The same selection always lands on the same node, and adding or removing a
+node only moves the keys of that node. With --policy random callbacks go to
+any node, as behind a round-robin balancer. Every other request goes to any
+node.
+
+Usage: python router.py [--nodes 3] [--policy affinity] [--port 8050] [--threads 4] [--cache 256]
+"""
+import argparse
+import hashlib
+import random
+import threading
+
+import requests
+from flask import Flask, Response, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from loadtest import free_port, start_server
+from routing import CALLBACK_ENDPOINT, KEY_HEADER, callback_route_key
+
+POLICIES = ['affinity', 'random']
+DEFAULT_CACHE_SIZE = 256
+# Not forwarded: they describe one connection, or a body requests has already decoded
+HOP_HEADERS = {'connection', 'keep-alive', 'transfer-encoding', 'content-encoding', 'content-length', 'host'}
+
+
+class QuietHandler(WSGIRequestHandler):
+    """Request handler without the per-request access log"""
+
+    def log_request(self, *args):
+        pass
+
+
+class Router:
+    """Forwards requests to app nodes, callbacks by route key or at random"""
+
+    def __init__(self, nodes, policy='affinity'):
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown routing policy {policy}')
+        self.nodes = list(nodes)
+        self.policy = policy
+        self.routed = {node: 0 for node in self.nodes}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.app = Flask(__name__)
+        self.app.add_url_rule('/', 'proxy', self.proxy, defaults={'path': ''}, methods=['GET', 'POST'])
+        self.app.add_url_rule('/<path:path>', 'proxy', self.proxy, methods=['GET', 'POST'])
+
+    @property
+    def session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def pick(self, key=None):
+        """Node for a route key: highest rendezvous score, or any node without affinity"""
+        if self.policy == 'affinity' and key:
+            return max(self.nodes, key=lambda node: hashlib.md5((node + key).encode()).digest())
+        return random.choice(self.nodes)
+
+    def proxy(self, path):
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_HEADERS}
+        key = None
+        if request.method == 'POST' and request.path == CALLBACK_ENDPOINT:
+            key = request.headers.get(KEY_HEADER) or callback_route_key(request.get_json(silent=True) or {})
+            headers[KEY_HEADER] = key
+        node = self.pick(key)
+        with self._lock:
+            self.routed[node] += 1
+
+        url = node + request.full_path if request.query_string else node + request.path
+        upstream = self.session.request(request.method, url, headers=headers, data=request.get_data(),
+                                        stream=True, allow_redirects=False)
+        response_headers = [(k, v) for k, v in upstream.headers.items() if k.lower() not in HOP_HEADERS]
+        response_headers.append(('X-Routed-To', node))
+        return Response(upstream.iter_content(65536), status=upstream.status_code, headers=response_headers)
+
+    def serve(self, port):
+        """Start serving on a background thread, returning the server"""
+        server = make_server('127.0.0.1', port, self.app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def start_nodes(count, threads=4, cache_size=DEFAULT_CACHE_SIZE, env=None):
+    """Launch count one-worker app nodes with response caches, returning their URLs and processes"""
+    urls, processes = [], []
+    try:
+        for _ in range(count):
+            port = free_port()
+            processes.append(start_server(port, 1, threads,
+                                          dict(env or {}, DASHBOARD_RESPONSE_CACHE=str(cache_size))))
+            urls.append(f'http://127.0.0.1:{port}')
+    except Exception:
+        stop_nodes(processes)
+        raise
+    return urls, processes
+
+
+def stop_nodes(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cache-affine proxy in front of local app nodes')
+    parser.add_argument('--nodes', type=int, default=3, help='app nodes to start')
+    parser.add_argument('--policy', choices=POLICIES, default='affinity')
+    parser.add_argument('--port', type=int, default=8050, help='port the proxy listens on')
+    parser.add_argument('--threads', type=int, default=4, help='threads per app node')
+    parser.add_argument('--cache', type=int, default=DEFAULT_CACHE_SIZE, help='responses cached per node')
+    options = parser.parse_args()
+
+    urls, processes = start_nodes(options.nodes, options.threads, options.cache)
+    server = Router(urls, options.policy).serve(options.port)
+    print(f'Routing ({options.policy}) http://127.0.0.1:{options.port} -> {", ".join(urls)}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        stop_nodes(processes)
@@ -0,0 +1,163 @@
+"""Cache-affine routing of callback requests across several app nodes.
+
+Behind a round-robin balancer, every node ends up caching the same popular
+selections, and each one still misses on its share of them. Routing by
+selection instead sends every request for one filter selection to the same
+node, so each node only caches its share and the hit rate grows with the
+number of nodes instead of shrinking.
+
+selection_route_key() turns a selection into a short hash, normalized
+through make_selection so that equivalent checklist states (ALL ticked, or
+the same values ticked in a different order) share a key. The page computes
+the same key in the browser (static/routing.js) and sends it on every
+callback request in the X-Selection-Key header, so a front proxy can hash on
+it, e.g. `hash $http_x_selection_key consistent;` in nginx or
+`balance hdr(X-Selection-Key)` in HAProxy. Proxies that can read the request
+body can use callback_route_key() instead (see router.py).
+
+With DASHBOARD_RESPONSE_CACHE set, each node also keeps that many callback
+responses, keyed by selection, output and the remaining inputs, and
+GET /_routing returns its hit and miss counters as JSON.
+"""
+import functools
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from flask import jsonify, request
+
+from backends import FILTER_DIMENSIONS, make_selection
+from datasets import dataset_name
+
+CALLBACK_ENDPOINT = '/_dash-update-component'
+KEY_HEADER = 'X-Selection-Key'
+
+# Checklists behind each filter dimension: the one holding the ALL box, then the others
+FILTER_GROUPS = {
+    'State': ['location-filter'],
+    'Industry': ['industry-filter-all', 'industry-filter1', 'industry-filter2', 'industry-filter3',
+                 'industry-filter4'],
+    'Study_Level': ['study-filter', 'study-filter2', 'study-filter3'],
+    'Employment_Type': ['employment-filter', 'employment-filter2'],
+    'Year': ['year-filter'],
+}
+FILTER_IDS = {component_id for group in FILTER_GROUPS.values() for component_id in group}
+
+
+def fnv1a(text):
+    """32-bit FNV-1a hash of a string, as computed by static/routing.js"""
+    value = 0x811c9dc5
+    for byte in text.encode('utf-8'):
+        value = ((value ^ byte) * 0x01000193) & 0xffffffff
+    return value
+
+
+def component_selection(values):
+    """Selection from the checklist values by component id, as read_selection in app.py builds it"""
+    lists = []
+    for dimension in FILTER_DIMENSIONS:
+        first, *others = FILTER_GROUPS[dimension]
+        ticked = list(values.get(first) or [])
+        if 'ALL' in ticked:
+            lists.append(['ALL'])
+            continue
+        for component_id in others:
+            ticked.extend(values.get(component_id) or [])
+        # A request without the checklists (None) selects everything; an empty year list nothing
+        lists.append(ticked if ticked or values.get(first) is not None else None)
+    return make_selection(*lists)
+
+
+def selection_route_key(selection, dataset):
+    """Short hash identifying a selection of a dataset"""
+    parts = [dataset]
+    for dimension in FILTER_DIMENSIONS:
+        values = selection.get(dimension)
+        parts.append(dimension + '=' + (','.join(str(v) for v in values) if values is not None else '*'))
+    return f"{fnv1a(';'.join(parts)):08x}"
+
+
+def callback_values(body):
+    """Component values in a callback request body, by id"""
+    return {item.get('id'): item.get('value') for item in body.get('inputs', []) + body.get('state', [])}
+
+
+def callback_route_key(body):
+    """Route key of a callback request body; callbacks without filters use the whole dataset's key"""
+    values = callback_values(body)
+    return selection_route_key(component_selection(values), dataset_name(values.get('url')))
+
+
+class ResponseCache:
+    """Least recently used callback responses, keyed by selection, output and the other inputs"""
+
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(body, route_key):
+        # Keyed by id.property, as one component (the row table) feeds several inputs; the
+        # changed props are included because some outputs depend on what triggered them
+        others = sorted((f"{item.get('id')}.{item.get('property')}", item.get('value'))
+                        for item in body.get('inputs', []) + body.get('state', [])
+                        if item.get('id') not in FILTER_IDS)
+        changed = sorted(body.get('changedPropIds') or [])
+        return json.dumps([route_key, body.get('output'), others, changed], default=str)
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'pid': os.getpid(), 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else None,
+                    'entries': len(self._entries), 'size': self.size}
+
+
+def register_selection_routing(server, cache=None):
+    """Tag callback responses with their route key and serve repeats from cache, if given"""
+    view = server.view_functions[CALLBACK_ENDPOINT]
+
+    @functools.wraps(view)
+    def routed(*args, **kwargs):
+        body = request.get_json(silent=True) or {}
+        # Recomputed rather than trusted from the request, so a stale page cannot poison the cache
+        route_key = callback_route_key(body)
+        key = ResponseCache.cache_key(body, route_key) if cache is not None else None
+        data = cache.get(key) if key is not None else None
+        if data is not None:
+            response = server.response_class(data, mimetype='application/json')
+            response.headers['X-Cache'] = 'hit'
+        else:
+            response = server.make_response(view(*args, **kwargs))
+            if key is not None:
+                # Responses degraded by admission control are not worth keeping
+                if response.status_code == 200 and 'X-Admission' not in response.headers:
+                    cache.put(key, response.get_data())
+                response.headers['X-Cache'] = 'miss'
+        response.headers[KEY_HEADER] = route_key
+        return response
+
+    server.view_functions[CALLBACK_ENDPOINT] = routed
+    if cache is not None:
+        server.add_url_rule('/_routing', 'routing_stats', lambda: jsonify(cache.stats()))
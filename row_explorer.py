@@ -0,0 +1,247 @@
+"""Server-side pages of the survey rows behind a selection.
+
+RowExplorer serves the row table one page at a time, without ever building
+the filtered rows. Every row belongs to one filter cell (a combination of the
+filter dimensions, as in trends.py). For each sortable column it keeps the
+presorted permutation of the rows, plus the rows' positions in that order
+grouped by cell, in one array of cell * rows + position keys. Both are built
+the first time the column is sorted on.
+
+A selection is a set of cells, so the number of its rows before any position
+in the sorted order takes one binary search per selected cell. Binary
+searching that count for the page's first and last rows gives the range of
+sorted positions holding the page. Gathering exactly those positions then
+costs the page size plus a few searches per cell, whatever the size of the
+selection.
+
+Column filters typed in the table header narrow the cells when they are on a
+filter dimension, and the position range when they are on the sorted
+column. Filters on any other column are checked row by row while walking the
+sorted order, so their cost grows with the rows skipped, and the row total
+is not known in advance.
+"""
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from backends import FILTER_DIMENSIONS
+
+ROW_ORDER = None
+# Rows fetched first while walking past rows rejected by a column filter; each
+# later block is as large as everything walked so far
+WALK_BLOCK = 1024
+
+# Operators of the DataTable filter syntax, longest spelling first
+OPERATORS = [('>=', 'ge'), ('<=', 'le'), ('!=', 'ne'), ('>', 'gt'), ('<', 'lt'), ('=', 'eq'),
+             ('contains', 'contains')]
+KNOWN_OPERATORS = {spelling for pair in OPERATORS for spelling in pair}
+RANGE_OPERATORS = {'ge', 'le', 'gt', 'lt', 'eq'}
+
+
+def parse_filter_query(query):
+    """(column, operator, value) terms of a DataTable filter query such as '{Salary} >= 50000 && {Gender} = Male'"""
+    terms = []
+    for part in (query or '').split(' && '):
+        match = re.match(r'\s*\{(?P<column>[^}]+)\}\s*(?P<operator>\S+)\s*(?P<value>.*?)\s*$', part)
+        if not match:
+            continue
+        spelled = match['operator'].lower()
+        # The table spells operators as symbols or words, optionally prefixed with s/i for case
+        if spelled[:1] in ('s', 'i') and spelled[1:] in KNOWN_OPERATORS:
+            spelled = spelled[1:]
+        if spelled not in KNOWN_OPERATORS:
+            continue
+        operator = dict(OPERATORS).get(spelled, spelled)
+        value = match['value']
+        if len(value) > 1 and value[0] == value[-1] and value[0] in '"\'`':
+            value = value[1:-1]
+        terms.append((match['column'], operator, value))
+    return terms
+
+
+def _compare(series, operator, value):
+    """Boolean mask of a column against one filter term; missing values only pass != """
+    known = series.notna().to_numpy()
+    if operator == 'contains':
+        return series.astype(str).str.contains(str(value), case=False, regex=False).to_numpy() & known
+    if pd.api.types.is_numeric_dtype(series):
+        try:
+            value = float(value)
+        except ValueError:
+            return np.zeros(len(series), dtype=bool)
+    else:
+        series, value = series.astype(str), str(value)
+    mask = {'eq': series == value, 'ne': series != value, 'gt': series > value, 'ge': series >= value,
+            'lt': series < value, 'le': series <= value}[operator].to_numpy()
+    return mask if operator == 'ne' else mask & known
+
+
+class _SortIndex:
+    """Rows of one column in sorted order, and their sorted positions grouped by cell"""
+
+    def __init__(self, frame, cell_ids, column):
+        rows = len(frame)
+        if column is ROW_ORDER:
+            self.order = np.arange(rows)
+            self.values = None
+            self.known = rows
+        else:
+            # Sorted through factorized codes, as object columns with missing values do not
+            # compare; missing values go last, as in sort_values, and are kept out of values
+            codes, uniques = pd.factorize(frame[column], sort=True)
+            codes = np.where(codes < 0, len(uniques), codes)
+            self.order = np.argsort(codes, kind='stable')
+            self.known = int((codes < len(uniques)).sum())
+            self.values = frame[column].to_numpy()[self.order[:self.known]]
+        positions = np.empty(rows, dtype=np.int64)
+        positions[self.order] = np.arange(rows)
+        self.keys = np.sort(cell_ids.astype(np.int64) * rows + positions)
+
+    def nbytes(self):
+        return self.order.nbytes + self.keys.nbytes + (self.values.nbytes if self.values is not None else 0)
+
+
+class RowExplorer:
+    """Sorted, filtered pages of a DataFrame of survey rows"""
+
+    def __init__(self, frame):
+        self.frame = frame.reset_index(drop=True)
+        self.columns = list(self.frame.columns)
+        self.dimensions = [d for d in FILTER_DIMENSIONS if d in self.columns]
+        if self.dimensions:
+            cell_ids, cells = pd.MultiIndex.from_frame(self.frame[self.dimensions]).factorize()
+            self.cells = pd.DataFrame(list(cells), columns=self.dimensions)
+        else:
+            cell_ids, self.cells = np.zeros(len(self.frame), dtype=np.int64), pd.DataFrame(index=[0])
+        self.cell_ids = cell_ids
+        self._indexes = {}
+        self._index_bytes = 0
+        self._lock = threading.Lock()
+
+    def _index(self, column):
+        with self._lock:
+            if column not in self._indexes:
+                self._indexes[column] = _SortIndex(self.frame, self.cell_ids, column)
+                self._index_bytes += self._indexes[column].nbytes()
+            return self._indexes[column]
+
+    def _cells(self, selection, terms):
+        """Ids of the cells in a selection that pass the filter terms on dimensions"""
+        mask = np.ones(len(self.cells), dtype=bool)
+        for dimension in self.dimensions:
+            values = selection.get(dimension)
+            if values is not None:
+                mask &= self.cells[dimension].isin(values).to_numpy()
+        for column, operator, value in terms:
+            mask &= _compare(self.cells[column], operator, value)
+        return np.flatnonzero(mask)
+
+    def _position_range(self, index, terms):
+        """Sorted positions [start, stop) passing the range terms on the sorted column"""
+        start, stop = 0, len(self.frame)
+        values = index.values
+        for _, operator, value in terms:
+            # Missing values, sorted last, pass no range term
+            stop = min(stop, index.known)
+            if pd.api.types.is_numeric_dtype(values.dtype):
+                value = float(value)
+            left = int(np.searchsorted(values, value, side='left'))
+            right = int(np.searchsorted(values, value, side='right'))
+            low, high = {'eq': (left, right), 'ge': (left, None), 'gt': (right, None),
+                         'le': (None, right), 'lt': (None, left)}[operator]
+            start = max(start, low) if low is not None else start
+            stop = min(stop, high) if high is not None else stop
+        return start, max(start, stop)
+
+    def _counter(self, index, cells):
+        """Function counting the selected rows before a sorted position"""
+        base = cells * len(self.frame)
+        firsts = np.searchsorted(index.keys, base)
+
+        def count(position):
+            return int((np.searchsorted(index.keys, base + position) - firsts).sum())
+        return count
+
+    @staticmethod
+    def _first_position(count, target, start, stop):
+        """Smallest position p in [start, stop] with count(p) >= target"""
+        while start < stop:
+            middle = (start + stop) // 2
+            if count(middle) >= target:
+                stop = middle
+            else:
+                start = middle + 1
+        return start
+
+    def _gather(self, index, cells, start, stop):
+        """Row numbers of the selected rows at sorted positions [start, stop), in order"""
+        base = cells * len(self.frame)
+        lows = np.searchsorted(index.keys, base + start)
+        lengths = np.searchsorted(index.keys, base + stop) - lows
+        # Concatenated key ranges lows[i]:lows[i] + lengths[i], without a Python loop over cells
+        shifts = np.repeat(lows - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        keys = index.keys[np.arange(lengths.sum()) + shifts]
+        positions = np.sort(keys - np.repeat(base, lengths))
+        return index.order[positions]
+
+    def page(self, selection, page, page_size, sort_by=None, descending=False, filter_query=None):
+        """One page of rows as a DataFrame, and the number of matching rows (None when unknown)"""
+        terms = parse_filter_query(filter_query)
+        terms = [t for t in terms if t[0] in self.columns]
+        column = sort_by if sort_by in self.columns else ROW_ORDER
+        index = self._index(column)
+
+        cell_terms = [t for t in terms if t[0] in self.dimensions]
+        range_terms = [t for t in terms if t[0] == column and t[1] in RANGE_OPERATORS and t not in cell_terms]
+        row_terms = [t for t in terms if t not in cell_terms and t not in range_terms]
+        try:
+            start, stop = self._position_range(index, range_terms)
+        except ValueError:
+            return self.frame.iloc[:0], 0
+
+        cells = self._cells(selection, cell_terms)
+        count = self._counter(index, cells)
+        before = count(start)
+        total = count(stop) - before
+        offset = page * page_size
+
+        if not row_terms:
+            if descending:
+                first, last = max(total - offset - page_size, 0), max(total - offset, 0)
+            else:
+                first, last = min(offset, total), min(offset + page_size, total)
+            low = self._first_position(count, before + first + 1, start, stop) - 1 if last > first else start
+            high = self._first_position(count, before + last, start, stop) if last > first else start
+            rows = self._gather(index, cells, low, high)
+            if descending:
+                rows = rows[::-1]
+            return self.frame.iloc[rows], total
+
+        # Walk the sorted order a block at a time, keeping the rows that pass the other terms
+        found, skipped, done = [], 0, 0
+        while done < total and len(found) < page_size:
+            block = min(max(WALK_BLOCK, page_size, done), total - done)
+            if descending:
+                high = self._first_position(count, before + total - done, start, stop)
+                low = self._first_position(count, before + total - done - block + 1, start, stop) - 1
+                rows = self._gather(index, cells, low, high)[::-1]
+            else:
+                low = self._first_position(count, before + done + 1, start, stop) - 1
+                high = self._first_position(count, before + done + block, start, stop)
+                rows = self._gather(index, cells, low, high)
+            done += block
+            chunk = self.frame.iloc[rows]
+            mask = np.ones(len(chunk), dtype=bool)
+            for name, operator, value in row_terms:
+                mask &= _compare(chunk[name], operator, value)
+            passed = chunk.index.to_numpy()[mask]
+            take = passed[max(offset - skipped, 0):]
+            skipped += len(passed) - len(take)
+            found.extend(take[:page_size - len(found)])
+        return self.frame.iloc[found], None
+
+    def memory_usage(self):
+        # Not under the lock, which is held while an index is being built
+        return int(self.cell_ids.nbytes + self._index_bytes)
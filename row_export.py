@@ -0,0 +1,134 @@
+"""Streaming download of the survey rows behind a filter selection.
+
+GET /export/rows.csv (or rows.parquet) takes the selection as repeated query
+parameters, e.g. ?State=NSW&State=VIC&Year=2024&dataset=<name>, and streams
+the matching rows back. The backend scans the rows EXPORT_CHUNKSIZE at a time
+(see QueryBackend.iter_rows), and each chunk is encoded and sent before the
+next one is read. Neither the filtered rows nor the response body are ever
+held in memory as a whole, so memory per download stays at about one chunk.
+
+Parquet output needs pyarrow; each chunk becomes one row group.
+"""
+from urllib.parse import urlencode
+
+from flask import Response, request, stream_with_context
+
+from backends import FILTER_DIMENSIONS, make_selection
+from datasets import DEFAULT_DATASET, dataset_name
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+EXPORT_CHUNKSIZE = 50_000
+URL_PREFIX = '/export/rows.'
+
+
+def export_url(selection, fmt, search=None):
+    """Download URL for the rows of a selection, in the dataset named by a page query string"""
+    params = [(dimension, value) for dimension in FILTER_DIMENSIONS
+              for value in (selection.get(dimension) or [])]
+    # An empty year selection is kept as a blank Year, so it does not read back as all years
+    if selection.get('Year') == ():
+        params.append(('Year', ''))
+    if dataset_name(search) != DEFAULT_DATASET:
+        params.append(('dataset', dataset_name(search)))
+    return URL_PREFIX + fmt + ('?' + urlencode(params) if params else '')
+
+
+def selection_from_args(args):
+    """Selection dict from the download's query parameters"""
+    return make_selection(*([value for value in args.getlist(dimension) if value] if dimension in args else None
+                            for dimension in FILTER_DIMENSIONS))
+
+
+def csv_chunks(frames):
+    """CSV bytes, one piece per frame, with the header from the first frame"""
+    header = True
+    for frame in frames:
+        if header or len(frame):
+            yield frame.to_csv(index=False, header=header).encode()
+            header = False
+
+
+class _Drain:
+    """Write-only file collecting what pyarrow writes until it is taken"""
+
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def parquet_chunks(frames):
+    """Parquet bytes, one row group per non-empty frame, followed by the footer"""
+    sink, writer, empty = _Drain(), None, None
+    for frame in frames:
+        if not len(frame):
+            if empty is None:
+                empty = frame
+            continue
+        # Empty frames carry no types for text columns, so the first rows set the schema
+        if writer is None:
+            schema = pa.Schema.from_pandas(frame, preserve_index=False)
+            writer = pq.ParquetWriter(sink, schema)
+        writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+        yield sink.take()
+    if writer is None:
+        if empty is None:
+            return
+        writer = pq.ParquetWriter(sink, pa.Schema.from_pandas(empty, preserve_index=False))
+    writer.close()
+    yield sink.take()
+
+
+FORMATS = {
+    'csv': ('text/csv', csv_chunks),
+    'parquet': ('application/vnd.apache.parquet', parquet_chunks),
+}
+
+
+def register_row_export(server, current_dataset):
+    """Add the /export/rows.<format> route; current_dataset(search) picks the dataset"""
+
+    @server.route(URL_PREFIX + '<fmt>')
+    def export_rows(fmt):
+        if fmt not in FORMATS:
+            return Response(f'Unknown export format {fmt}', status=404, mimetype='text/plain')
+        if fmt == 'parquet' and pq is None:
+            return Response('Parquet export needs pyarrow', status=501, mimetype='text/plain')
+
+        try:
+            selection = selection_from_args(request.args)
+        except ValueError:
+            return Response('Year must be a whole number', status=400, mimetype='text/plain')
+        backend = current_dataset('?' + request.query_string.decode()).backend
+        try:
+            frames = backend.iter_rows(selection, EXPORT_CHUNKSIZE)
+        except NotImplementedError as e:
+            return Response(str(e), status=501, mimetype='text/plain')
+        mimetype, encode = FORMATS[fmt]
+        return Response(stream_with_context(encode(frames)), mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename="students.{fmt}"'})
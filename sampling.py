@@ -0,0 +1,207 @@
+"""Approximate answers from a stratified sample, with confidence intervals.
+
+SampleBackend streams the rows of an exact backend once and keeps a Bernoulli
+sample within each stratum. A stratum is one combination of the filter
+dimensions (State, Industry, Study_Level, Employment_Type, Year), sampled at
+the given fraction but never below min_rows rows, and kept whole when it is
+smaller than that. Every selection is then a union of whole strata. Its row
+count is exact, and small slices always keep enough rows to be estimated.
+
+Estimates use the usual stratified (expansion) estimators. Each sampled row
+stands for N_h / n_h rows of its stratum. Totals and counts are weighted sums,
+means are weighted-total / weighted-count ratios, and the median is the
+weighted median. The *_margin methods give the half-width of a 95%
+confidence interval: the stratified variance with finite population
+correction for totals, its linearization for ratios, and Woodruff's interval
+for the median.
+"""
+import numpy as np
+import pandas as pd
+
+from backends import FILTER_DIMENSIONS, QueryBackend, selection_mask
+
+Z_95 = 1.959964
+DEFAULT_FRACTION = 0.01
+DEFAULT_MIN_ROWS = 30
+DEFAULT_CHUNKSIZE = 100_000
+
+
+class SampleBackend(QueryBackend):
+    """Answers the dashboard queries approximately from a stratified sample of another backend"""
+
+    def __init__(self, source, fraction=DEFAULT_FRACTION, min_rows=DEFAULT_MIN_ROWS, seed=0,
+                 chunksize=DEFAULT_CHUNKSIZE):
+        self.source = source
+        self.fraction = fraction
+        self.dimensions = [d for d in FILTER_DIMENSIONS if d in source.columns]
+
+        # Exact stratum sizes first, then one streaming pass keeping each row with its stratum's rate
+        strata = source.count_by({}, self.dimensions)
+        strata[self.dimensions] = strata[self.dimensions].astype(object)
+        index = pd.MultiIndex.from_frame(strata[self.dimensions])
+        population = strata['Rows'].to_numpy(np.float64)
+        rates = np.where(population <= min_rows, 1.0, np.maximum(fraction, min_rows / np.maximum(population, 1)))
+
+        rng = np.random.default_rng(seed)
+        parts = []
+        for chunk in source.iter_rows({}, chunksize):
+            ids = index.get_indexer(pd.MultiIndex.from_frame(chunk[self.dimensions].astype(object)))
+            keep = rng.random(len(chunk)) < rates[ids]
+            parts.append(chunk[keep].assign(_Stratum=ids[keep]))
+        self.sample = pd.concat(parts, ignore_index=True)
+        self.columns = [c for c in self.sample.columns if c != '_Stratum']
+
+        sampled = np.bincount(self.sample['_Stratum'], minlength=len(strata)).astype(np.float64)
+        strata['Sampled'] = sampled
+        self.strata = strata
+        self.population = population
+        self.sampled = sampled
+        # Expansion weight of a sampled row, and each stratum's variance factor N^2 (1 - n/N) / n
+        self.weights = np.divide(population, sampled, out=np.zeros_like(population), where=sampled > 0)
+        self.factors = np.divide(population ** 2 * (1 - sampled / np.maximum(population, 1)), sampled,
+                                 out=np.zeros_like(population), where=sampled > 0)
+        self._row_weights = self.weights[self.sample['_Stratum'].to_numpy()]
+
+    def _selected(self, selection):
+        """Sampled rows in a selection, their stratum ids and weights"""
+        mask = selection_mask(self.sample, selection)
+        return self.sample[mask], self.sample['_Stratum'].to_numpy()[mask], self._row_weights[mask]
+
+    @staticmethod
+    def _known(rows, column):
+        """Values of a column with missing ones as 0, and whether each is present"""
+        values = rows[column].to_numpy(np.float64)
+        known = ~np.isnan(values)
+        return np.where(known, values, 0), known
+
+    def _variance(self, strata_ids, values, groups=None, group_count=1):
+        """Stratified variance of the estimated total of values, per group"""
+        if not len(values):
+            return np.zeros(group_count)
+        groups = np.zeros(len(values), dtype=np.int64) if groups is None else groups
+        size = len(self.population)
+        cells = groups * size + strata_ids
+        values = np.asarray(values, dtype=np.float64)
+        sums = np.bincount(cells, weights=values, minlength=group_count * size).astype(np.float64)
+        squares = np.bincount(cells, weights=values ** 2, minlength=group_count * size).astype(np.float64)
+        sums, squares = sums.reshape(group_count, size), squares.reshape(group_count, size)
+        n = self.sampled
+        spread = np.divide(squares - np.divide(sums ** 2, n, out=np.zeros_like(sums), where=n > 0), n - 1,
+                           out=np.zeros_like(sums), where=n > 1)
+        return (self.factors * np.maximum(spread, 0)).sum(axis=1)
+
+    def values(self, dimension):
+        if dimension in self.dimensions:
+            return sorted(self.strata[dimension].unique().tolist())
+        return sorted(self.sample[dimension].unique().tolist())
+
+    def filter(self, selection):
+        """Sampled rows in the selection (not all matching rows)"""
+        return self._selected(selection)[0].drop(columns='_Stratum')
+
+    def iter_rows(self, selection, chunksize):
+        return self.source.iter_rows(selection, chunksize)
+
+    def count(self, selection):
+        # Selections are unions of whole strata, so the count is exact
+        return int(self.population[selection_mask(self.strata, selection)].sum())
+
+    def count_by(self, selection, by, column=None):
+        rows, _, weights = self._selected(selection)
+        if column is not None:
+            weights = weights * rows[column].notna().to_numpy()
+        counts = pd.Series(weights, index=rows.index).groupby([rows[c] for c in by], observed=True).sum()
+        return counts.rename('Rows').reset_index()
+
+    # Missing values are skipped, as pandas does: totals add only the present values,
+    # and means divide by the estimated count of present values
+    def total(self, selection, columns):
+        rows, _, weights = self._selected(selection)
+        return {column: float(weights @ self._known(rows, column)[0]) for column in columns}
+
+    def total_margin(self, selection, columns):
+        """95% half-width of each column total"""
+        rows, strata_ids, _ = self._selected(selection)
+        return {column: float(Z_95 * np.sqrt(self._variance(strata_ids, self._known(rows, column)[0])[0]))
+                for column in columns}
+
+    def _grouped(self, selection, by, column):
+        rows, strata_ids, weights = self._selected(selection)
+        # Rows missing a group value belong to no group, as in pandas groupby
+        grouped = rows[by].notna().all(axis=1).to_numpy()
+        rows, strata_ids, weights = rows[grouped], strata_ids[grouped], weights[grouped]
+        codes, labels = pd.MultiIndex.from_frame(rows[by].astype(object)).factorize()
+        values, known = self._known(rows, column)
+        totals = np.bincount(codes, weights=weights * values, minlength=len(labels))
+        counts = np.bincount(codes, weights=weights * known, minlength=len(labels))
+        result = pd.DataFrame(list(labels), columns=by)
+        return result, rows, strata_ids, codes, (values, known), totals, counts
+
+    def sum_by(self, selection, by, column):
+        result, *_, totals, _ = self._grouped(selection, by, column)
+        result[column] = totals
+        return result.sort_values(by, ignore_index=True)
+
+    def mean_by(self, selection, by, column):
+        result, *_, totals, counts = self._grouped(selection, by, column)
+        result[column] = np.divide(totals, counts, out=np.full(len(totals), np.nan), where=counts > 0)
+        return result.sort_values(by, ignore_index=True)
+
+    def mean_by_margin(self, selection, by, column):
+        """95% half-width of the mean of a column per group"""
+        result, rows, strata_ids, codes, (values, known), totals, counts = self._grouped(selection, by, column)
+        ratios = np.divide(totals, counts, out=np.zeros_like(totals), where=counts > 0)
+        # Linearized ratio: the variance of the total of (x - R) over the group's present values, over N^2
+        residuals = np.where(known, values - ratios[codes], 0)
+        variance = self._variance(strata_ids, residuals, codes, len(result))
+        result[column] = np.divide(Z_95 * np.sqrt(variance), counts, out=np.full(len(counts), np.nan),
+                                   where=counts > 0)
+        return result.sort_values(by, ignore_index=True)
+
+    def mean(self, selection, column):
+        rows, _, weights = self._selected(selection)
+        values, known = self._known(rows, column)
+        count = weights @ known
+        return float(weights @ values / count) if count else np.nan
+
+    def mean_margin(self, selection, column):
+        """95% half-width of the mean of a column"""
+        rows, strata_ids, weights = self._selected(selection)
+        values, known = self._known(rows, column)
+        count = weights @ known
+        if not count:
+            return np.nan
+        residuals = np.where(known, values - weights @ values / count, 0)
+        return float(Z_95 * np.sqrt(self._variance(strata_ids, residuals)[0]) / count)
+
+    def _quantile(self, values, weights, q):
+        order = np.argsort(values, kind='stable')
+        cumulative = np.cumsum(weights[order])
+        position = np.searchsorted(cumulative, np.clip(q, 0, 1) * cumulative[-1], side='left')
+        return values[order][min(position, len(values) - 1)]
+
+    def median(self, selection, column):
+        rows, _, weights = self._selected(selection)
+        values, known = self._known(rows, column)
+        if not known.any():
+            return np.nan
+        return float(self._quantile(values[known], weights[known], 0.5))
+
+    def median_margin(self, selection, column):
+        """95% half-width of the median (Woodruff's interval)"""
+        rows, strata_ids, weights = self._selected(selection)
+        values, known = self._known(rows, column)
+        if not known.any():
+            return np.nan
+        values, strata_ids, weights = values[known], strata_ids[known], weights[known]
+        median = self._quantile(values, weights, 0.5)
+        # Standard error of the share of rows below the median, mapped back through the quantiles
+        below = (values <= median).astype(np.float64)
+        share = weights @ below / weights.sum()
+        error = np.sqrt(self._variance(strata_ids, below - share)[0]) / weights.sum()
+        low = self._quantile(values, weights, 0.5 - Z_95 * error)
+        high = self._quantile(values, weights, 0.5 + Z_95 * error)
+        return float((high - low) / 2)
+
+    def memory_usage(self):
+        return int(self.sample.memory_usage(deep=True).sum() + self.strata.memory_usage(deep=True).sum())
@@ -0,0 +1,157 @@
+"""SQLite query backend.
+
+The survey rows are loaded once into an on-disk SQLite database with an index
+on each filter column (State, Industry, Study_Level, Employment_Type, Year),
+and every panel aggregate is answered with a single SQL query. Only query
+results are held in Python, so the dataset does not need to fit in a
+worker's memory, and any number of app processes can open the same file
+read-only.
+
+Usage: python sqlite_backend.py [csv path] [database path] [--chunksize N]
+"""
+import argparse
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from backends import FILTER_DIMENSIONS, QueryBackend
+
+TABLE = 'students'
+DEFAULT_CHUNKSIZE = 100_000
+
+
+def build_database(csv_path, db_path, chunksize=DEFAULT_CHUNKSIZE):
+    """Stream a survey CSV into an indexed SQLite database"""
+    tmp_path = f'{db_path}.{os.getpid()}.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    connection = sqlite3.connect(tmp_path)
+    try:
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+            chunk.to_sql(TABLE, connection, if_exists='append', index=False)
+        columns = [row[1] for row in connection.execute(f'PRAGMA table_info({TABLE})')]
+        for dimension in FILTER_DIMENSIONS:
+            if dimension in columns:
+                connection.execute(f'CREATE INDEX idx_{dimension.lower()} ON {TABLE} ("{dimension}")')
+        connection.execute('ANALYZE')
+        connection.commit()
+    finally:
+        connection.close()
+
+    # Publish atomically so concurrent app processes never see a partial file
+    os.replace(tmp_path, db_path)
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+class SQLiteBackend(QueryBackend):
+    """Answers the dashboard queries with SQL against an indexed SQLite file"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self.columns = [row[1] for row in self._connection().execute(f'PRAGMA table_info({TABLE})')]
+
+    def _connection(self):
+        # sqlite3 connections are per thread; opened read-only so workers can share the file
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True)
+            self._local.connection = connection
+        return connection
+
+    def _where(self, selection, not_null=()):
+        """WHERE clause and parameters for a selection, also excluding NULLs in the not_null columns"""
+        clauses, params = [], []
+        for dimension in FILTER_DIMENSIONS:
+            values = selection.get(dimension)
+            if values is not None and dimension in self.columns:
+                clauses.append(f"{_quote(dimension)} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        clauses.extend(f'{_quote(column)} IS NOT NULL' for column in not_null)
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def _query(self, sql, params):
+        return self._connection().execute(sql, params).fetchall()
+
+    def values(self, dimension):
+        rows = self._query(f'SELECT DISTINCT {_quote(dimension)} FROM {TABLE} '
+                           f'WHERE {_quote(dimension)} IS NOT NULL ORDER BY 1', [])
+        return [row[0] for row in rows]
+
+    def filter(self, selection):
+        where, params = self._where(selection)
+        return pd.read_sql_query(f'SELECT * FROM {TABLE}{where}', self._connection(), params=params)
+
+    def iter_rows(self, selection, chunksize):
+        where, params = self._where(selection)
+        return pd.read_sql_query(f'SELECT * FROM {TABLE}{where}', self._connection(), params=params,
+                                 chunksize=chunksize)
+
+    def count(self, selection):
+        where, params = self._where(selection)
+        return self._query(f'SELECT COUNT(*) FROM {TABLE}{where}', params)[0][0]
+
+    def total(self, selection, columns):
+        where, params = self._where(selection)
+        sums = ', '.join(f'COALESCE(SUM({_quote(c)}), 0)' for c in columns)
+        return dict(zip(columns, self._query(f'SELECT {sums} FROM {TABLE}{where}', params)[0]))
+
+    def _grouped(self, selection, by, aggregate, column):
+        # Rows with a NULL group value belong to no group, as in pandas groupby
+        where, params = self._where(selection, not_null=by)
+        groups = ', '.join(_quote(c) for c in by)
+        rows = self._query(f'SELECT {groups}, {aggregate}({_quote(column)}) FROM {TABLE}{where} '
+                           f'GROUP BY {groups} ORDER BY {groups}', params)
+        return pd.DataFrame(rows, columns=list(by) + [column])
+
+    def count_by(self, selection, by, column=None):
+        where, params = self._where(selection, not_null=by)
+        groups = ', '.join(_quote(c) for c in by)
+        counted = '*' if column is None else _quote(column)
+        rows = self._query(f'SELECT {groups}, COUNT({counted}) FROM {TABLE}{where} '
+                           f'GROUP BY {groups} ORDER BY {groups}', params)
+        return pd.DataFrame(rows, columns=list(by) + ['Rows'])
+
+    def sum_by(self, selection, by, column):
+        return self._grouped(selection, by, 'SUM', column)
+
+    def mean_by(self, selection, by, column):
+        return self._grouped(selection, by, 'AVG', column)
+
+    def mean(self, selection, column):
+        where, params = self._where(selection)
+        value = self._query(f'SELECT AVG({_quote(column)}) FROM {TABLE}{where}', params)[0][0]
+        return np.nan if value is None else value
+
+    def median(self, selection, column):
+        # NULLs sort first, so they are left out of both the count and the sort
+        where, params = self._where(selection, not_null=[column])
+        count = self._query(f'SELECT COUNT({_quote(column)}) FROM {TABLE}{where}', params)[0][0]
+        if count == 0:
+            return np.nan
+        # The middle one or two values, found by the sort rather than loaded into Python
+        rows = self._query(f'SELECT {_quote(column)} FROM {TABLE}{where} ORDER BY 1 LIMIT ? OFFSET ?',
+                           params + [2 - count % 2, (count - 1) // 2])
+        return float(np.mean([row[0] for row in rows]))
+
+    def memory_usage(self):
+        # Rows stay on disk; SQLite's page cache is bounded and shared with the OS
+        return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load a survey CSV into an indexed SQLite database')
+    parser.add_argument('csv_path', nargs='?', default='international students data.csv')
+    parser.add_argument('db_path', nargs='?', default='international students data.sqlite')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    options = parser.parse_args()
+
+    build_database(options.csv_path, options.db_path, options.chunksize)
+    print(f'{SQLiteBackend(options.db_path).count({})} rows -> {options.db_path}')
@@ -0,0 +1,71 @@
+// Sends the route key of the current filter selection with every Dash callback
+// request, in the X-Selection-Key header, so a front proxy can route identical
+// selections to the same app node. Mirrors FILTER_GROUPS, component_selection()
+// and selection_route_key() in routing.py; both sides must produce the same key.
+(function () {
+    var FILTER_GROUPS = [
+        ['State', ['location-filter']],
+        ['Industry', ['industry-filter-all', 'industry-filter1', 'industry-filter2', 'industry-filter3',
+                      'industry-filter4']],
+        ['Study_Level', ['study-filter', 'study-filter2', 'study-filter3']],
+        ['Employment_Type', ['employment-filter', 'employment-filter2']],
+        ['Year', ['year-filter']]
+    ];
+
+    function fnv1a(text) {
+        var value = 0x811c9dc5;
+        var bytes = unescape(encodeURIComponent(text));
+        for (var i = 0; i < bytes.length; i++) {
+            value = Math.imul(value ^ bytes.charCodeAt(i), 0x01000193) >>> 0;
+        }
+        return ('0000000' + value.toString(16)).slice(-8);
+    }
+
+    function datasetName(search) {
+        var match = /(?:^|[?&])dataset=([^&]*)/.exec(search || '');
+        return match ? match[1] : 'default';
+    }
+
+    function routeKey(body) {
+        var values = {};
+        (body.inputs || []).concat(body.state || []).forEach(function (item) {
+            values[item.id] = item.value;
+        });
+        var parts = [datasetName(values.url)];
+        FILTER_GROUPS.forEach(function (group) {
+            var dimension = group[0], ids = group[1];
+            var ticked = (values[ids[0]] || []).slice();
+            if (ticked.indexOf('ALL') < 0) {
+                ids.slice(1).forEach(function (id) { ticked = ticked.concat(values[id] || []); });
+            }
+            // Nothing ticked means everything, except for years when the year checklist was sent
+            var none = dimension === 'Year' && values[ids[0]] != null;
+            if ((!ticked.length && !none) || ticked.indexOf('ALL') >= 0) {
+                parts.push(dimension + '=*');
+                return;
+            }
+            if (dimension === 'Year') {
+                ticked = ticked.map(Number).sort(function (a, b) { return a - b; });
+            } else {
+                ticked = ticked.map(String).sort();
+            }
+            ticked = ticked.filter(function (v, i) { return i === 0 || v !== ticked[i - 1]; });
+            parts.push(dimension + '=' + ticked.join(','));
+        });
+        return fnv1a(parts.join(';'));
+    }
+
+    var fetch = window.fetch;
+    window.fetch = function (url, options) {
+        if (typeof url === 'string' && url.indexOf('_dash-update-component') >= 0 && options && options.body) {
+            try {
+                var headers = new Headers(options.headers || {});
+                headers.set('X-Selection-Key', routeKey(JSON.parse(options.body)));
+                options = Object.assign({}, options, {headers: headers});
+            } catch (e) {
+                // Unrouted requests still work, they just land on any node
+            }
+        }
+        return fetch.apply(this, [url, options]);
+    };
+})();
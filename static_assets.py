@@ -0,0 +1,142 @@
+"""Self-hosted static asset pipeline for the dashboard.
+
+Source stylesheets and scripts live in static/ and are copied into static/dist/ under
+content-hash filenames, together with pre-compressed .gz (and .br when the
+brotli package is installed) variants. The Flask server then serves them with
+far-future immutable cache headers, so the browser never needs the CDN and
+never re-downloads a file until its contents change.
+
+The state boundary GeoJSON used by the choropleth map goes through the same
+pipeline after being simplified to DASHBOARD_MAP_TOLERANCE degrees.
+
+Run `python static_assets.py` to rebuild ahead of a deployment; the app also
+builds on start-up if the dist folder is missing or stale. Only missing files
+are written, so an up-to-date dist folder can be deployed read-only.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+from flask import request, send_from_directory
+
+from geometry import simplify_geojson
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+
+# Served in this order, so Bootstrap comes before the dashboard overrides
+SOURCE_FILES = ['vendor/bootstrap.min.css', 'dashboard.css']
+SCRIPT_FILES = ['routing.js']
+GEOJSON_SOURCE = 'geo/australia-states.geojson'
+DEFAULT_MAP_TOLERANCE = 0.02
+
+URL_PREFIX = '/dist/'
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+HASH_LENGTH = 10
+
+
+# Helper function to write a file without exposing a half-written copy
+def _write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as tmp:
+        tmp.write(data)
+    os.replace(tmp_path, path)
+
+
+def hashed_name(source, data):
+    """Return the fingerprinted filename for a source file"""
+    stem, ext = os.path.splitext(os.path.basename(source))
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    return f'{stem}.{digest}{ext}'
+
+
+def publish(source, data):
+    """Write one asset and its compressed variants to the dist folder, returning its name"""
+    name = hashed_name(source, data)
+    target = os.path.join(DIST_DIR, name)
+
+    # Content-addressed, so an existing file is already up to date
+    if not os.path.exists(target):
+        os.makedirs(DIST_DIR, exist_ok=True)
+        _write_atomic(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write_atomic(target + '.br', brotli.compress(data, quality=11))
+        _write_atomic(target, data)
+    elif brotli is not None and not os.path.exists(target + '.br'):
+        _write_atomic(target + '.br', brotli.compress(data, quality=11))
+    return name
+
+
+def build_assets(map_tolerance=None):
+    """Fingerprint and pre-compress every source asset, returning the manifest"""
+    if map_tolerance is None:
+        map_tolerance = float(os.environ.get('DASHBOARD_MAP_TOLERANCE', DEFAULT_MAP_TOLERANCE))
+    manifest = {}
+
+    for source in SOURCE_FILES + SCRIPT_FILES:
+        with open(os.path.join(STATIC_DIR, source), 'rb') as f:
+            manifest[source] = publish(source, f.read())
+
+    with open(os.path.join(STATIC_DIR, GEOJSON_SOURCE)) as f:
+        geojson = simplify_geojson(json.load(f), map_tolerance)
+    manifest[GEOJSON_SOURCE] = publish(GEOJSON_SOURCE, json.dumps(geojson, separators=(',', ':')).encode('utf-8'))
+    return manifest
+
+
+def stylesheet_urls(manifest):
+    """List the fingerprinted stylesheet URLs in load order"""
+    return [URL_PREFIX + manifest[source] for source in SOURCE_FILES]
+
+
+def script_urls(manifest):
+    """List the fingerprinted script URLs in load order"""
+    return [URL_PREFIX + manifest[source] for source in SCRIPT_FILES]
+
+
+def asset_url(manifest, source):
+    """Fingerprinted URL of one source asset"""
+    return URL_PREFIX + manifest[source]
+
+
+def register_static_assets(server):
+    """Add the route serving fingerprinted assets to a Flask server"""
+
+    @server.route(URL_PREFIX + '<path:filename>')
+    def serve_dist_asset(filename):
+        # Parsed with q-values, so 'br;q=0' refuses brotli; the preferred encoding wins, brotli on ties
+        accepted = request.accept_encodings
+        mimetype = {'.css': 'text/css', '.js': 'text/javascript', '.geojson': 'application/geo+json'}.get(os.path.splitext(filename)[1])
+
+        encodings = sorted((('br', '.br'), ('gzip', '.gz')), key=lambda pair: -accepted[pair[0]])
+        for encoding, suffix in encodings:
+            if accepted[encoding] > 0 and os.path.exists(os.path.join(DIST_DIR, filename + suffix)):
+                response = send_from_directory(DIST_DIR, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(DIST_DIR, filename, mimetype=mimetype)
+
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    return serve_dist_asset
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build the fingerprinted static assets')
+    parser.add_argument('--map-tolerance', type=float, help='state outline simplification, in degrees')
+    options = parser.parse_args()
+
+    for source, name in build_assets(options.map_tolerance).items():
+        print(f'{source} -> {URL_PREFIX}{name}')
@@ -0,0 +1,100 @@
+"""Year-range aggregates from cumulative sums along the Year axis.
+
+The survey is reduced once to a dense array indexed by filter cell (one
+combination of State, Industry, Study_Level and Employment_Type), year and
+measure, holding the row count and the sum of each measure. The array is then
+accumulated along Year, so the total of any contiguous range of years is
+prefix[:, last + 1] - prefix[:, first] for each cell. A query touches every
+matching cell once, whatever the number of years in the range, and never
+goes back to the survey rows.
+
+Averaged measures (Employment_Rate, Salary) are kept as sums and divided by
+their count of non-missing values over the same range, so their means are
+exact. Medians cannot
+be combined this way and are not offered.
+"""
+import numpy as np
+import pandas as pd
+
+from backends import FILTER_DIMENSIONS
+
+SUM_MEASURES = ['Visa_Applications', 'Post_Study_Work', 'Job_Placement', 'Skilled_Visa', 'PR_Grant']
+MEAN_MEASURES = ['Employment_Rate', 'Salary']
+
+
+class YearPrefixSums:
+    """Cumulative per-cell sums along Year, built once from a query backend"""
+
+    def __init__(self, backend, sum_measures=SUM_MEASURES, mean_measures=MEAN_MEASURES):
+        self.sum_measures = [c for c in sum_measures if c in backend.columns]
+        self.mean_measures = [c for c in mean_measures if c in backend.columns]
+        self.measures = self.sum_measures + self.mean_measures
+        self.dimensions = [d for d in FILTER_DIMENSIONS if d != 'Year' and d in backend.columns]
+        self.years = np.asarray(backend.values('Year'))
+
+        by = self.dimensions + ['Year']
+        table = backend.count_by({}, by)
+        for column in self.measures:
+            table = table.merge(backend.sum_by({}, by, column), on=by, how='left')
+        # Averaged measures are divided by their own count of non-missing values
+        counts = [column + '_Count' for column in self.mean_measures]
+        for column, count in zip(self.mean_measures, counts):
+            table = table.merge(backend.count_by({}, by, column).rename(columns={'Rows': count}), on=by, how='left')
+
+        if self.dimensions:
+            cell_ids, cells = pd.MultiIndex.from_frame(table[self.dimensions]).factorize()
+            self.cells = pd.DataFrame(list(cells), columns=self.dimensions)
+        else:
+            cell_ids, self.cells = np.zeros(len(table), dtype=np.int64), pd.DataFrame(index=[0])
+        year_ids = np.searchsorted(self.years, table['Year'].to_numpy())
+
+        # Rows first, then one slot per measure, then the averaged measures' counts;
+        # year 0 of the prefix is all zeros
+        slots = ['Rows'] + self.measures + counts
+        dense = np.zeros((len(self.cells), len(self.years) + 1, len(slots)))
+        dense[cell_ids, year_ids + 1] = table[slots].fillna(0).to_numpy(np.float64)
+        self.prefix = np.cumsum(dense, axis=1)
+
+    def _cells(self, selection):
+        """Boolean mask of the cells in a selection (its Year is ignored)"""
+        mask = np.ones(len(self.cells), dtype=bool)
+        for dimension in self.dimensions:
+            values = selection.get(dimension)
+            if values is not None:
+                mask &= self.cells[dimension].isin(values).to_numpy()
+        return mask
+
+    def _bounds(self, first_year, last_year):
+        """Prefix positions enclosing the years first_year..last_year"""
+        return (int(np.searchsorted(self.years, first_year, side='left')),
+                int(np.searchsorted(self.years, last_year, side='right')))
+
+    def _values(self, sums):
+        """Measure values from summed slots: totals, or means over the non-missing count"""
+        rows = sums[..., 0]
+        values = {'Rows': rows}
+        for position, column in enumerate(self.measures, start=1):
+            if column in self.mean_measures:
+                known = sums[..., len(self.measures) + 1 + self.mean_measures.index(column)]
+                values[column] = np.where(known > 0, sums[..., position] / np.maximum(known, 1), np.nan)
+            else:
+                values[column] = sums[..., position]
+        return values
+
+    def range_totals(self, selection, first_year, last_year):
+        """Row count, measure totals and means over a contiguous range of years"""
+        start, stop = self._bounds(first_year, last_year)
+        cells = self.prefix[self._cells(selection)]
+        sums = (cells[:, stop] - cells[:, start]).sum(axis=0)
+        return {column: float(value) for column, value in self._values(sums).items()}
+
+    def yearly(self, selection, first_year, last_year):
+        """One row per year of the range with its measures and year-over-year change"""
+        start, stop = self._bounds(first_year, last_year)
+        cells = self.prefix[self._cells(selection)].sum(axis=0)
+        sums = cells[start + 1:stop + 1] - cells[start:stop]
+        trend = pd.DataFrame(self._values(sums))
+        trend.insert(0, 'Year', self.years[start:stop])
+        for column in self.measures:
+            trend[column + '_Change'] = trend[column].pct_change(fill_method=None) * 100
+        return trend